@@ -1,20 +1,228 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import time
 from datetime import datetime
-import yfinance as yf
+import atexit
 import base64
+import csv
+import hashlib
+import importlib
+import json
 import os
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import urllib.request
+import uuid
+import unicodedata
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import closing, contextmanager, nullcontext
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, wait
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# --- 0a. METRIKY (Prometheus textový formát) 📊 ---
+METRIKY_ADRESAR = os.environ.get("METRIKY_ADRESAR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "metriky"))
+METRIKY_INTERVAL = float(os.environ.get("METRIKY_INTERVAL", 15)) # Jak často (s) nejvýš přepisujeme soubor s metrikami
+METRIKY_BUCKETY = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+@st.cache_resource(show_spinner=False)
+def metriky():
+    """Sdílené v procesu: čítače a histogramy časů, klíč = (název, štítky)"""
+    atexit.register(smaz_metriky)
+    return {"zamek": threading.Lock(), "citace": {}, "histogramy": {}, "zapsano": 0.0}
+
+def pocitej(nazev, hodnota=1, **stitky):
+    m = metriky()
+    klic = (nazev, tuple(sorted(stitky.items())))
+    with m["zamek"]:
+        m["citace"][klic] = m["citace"].get(klic, 0) + hodnota
+
+def zaznamenej_cas(nazev, sekundy, **stitky):
+    m = metriky()
+    klic = (nazev, tuple(sorted(stitky.items())))
+    with m["zamek"]:
+        h = m["histogramy"].setdefault(klic, {"buckety": [0] * len(METRIKY_BUCKETY), "soucet": 0.0, "pocet": 0})
+        i = bisect_left(METRIKY_BUCKETY, sekundy)
+        if i < len(METRIKY_BUCKETY): h["buckety"][i] += 1
+        h["soucet"] += sekundy
+        h["pocet"] += 1
+
+@contextmanager
+def mereni(nazev, **stitky):
+    zacatek = time.perf_counter()
+    try: yield
+    finally: zaznamenej_cas(nazev, time.perf_counter() - zacatek, **stitky)
+
+def merene(funkce):
+    """Dekorátor: doba každého volání jde do pruvodce_funkce_seconds{funkce=...}"""
+    @wraps(funkce)
+    def obal(*args, **kwargs):
+        with mereni("pruvodce_funkce_seconds", funkce=funkce.__name__):
+            return funkce(*args, **kwargs)
+    return obal
+
+def merene_fragment(funkce):
+    """Dekorátor pod @st.fragment / @st.dialog: samostatný rerun fragmentu jde do pruvodce_fragment_seconds{fragment=...}
+    a do časů session (při celém běhu je fragment už v pruvodce_stranka_seconds). Rerun přes st.rerun() se neměří."""
+    @wraps(funkce)
+    def obal(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        if ctx is None or not ctx.fragment_ids_this_run: return funkce(*args, **kwargs)
+        zacatek = time.perf_counter()
+        vysledek = funkce(*args, **kwargs)
+        doba = time.perf_counter() - zacatek
+        zaznamenej_cas("pruvodce_fragment_seconds", doba, fragment=funkce.__name__)
+        st.session_state.casy_stranek = (st.session_state.get('casy_stranek', []) + [(f"{funkce.__name__} (fragment)", round(1000 * doba, 1))])[-20:]
+        exportuj_metriky()
+        return vysledek
+    return obal
+
+def metriky_text():
+    m = metriky()
+    stitky_text = lambda stitky: ",".join(f'{k}="{v}"' for k, v in stitky)
+    radky = []
+    with m["zamek"]:
+        for (nazev, stitky), hodnota in sorted(m["citace"].items()):
+            if f"# TYPE {nazev} counter" not in radky: radky.append(f"# TYPE {nazev} counter")
+            radky.append(f"{nazev}{{{stitky_text(stitky)}}} {hodnota}")
+        for (nazev, stitky), h in sorted(m["histogramy"].items()):
+            if f"# TYPE {nazev} histogram" not in radky: radky.append(f"# TYPE {nazev} histogram")
+            kumulativne = 0
+            for hranice, pocet in zip(METRIKY_BUCKETY, h["buckety"]):
+                kumulativne += pocet
+                radky.append(f'{nazev}_bucket{{{stitky_text(stitky + (("le", hranice),))}}} {kumulativne}')
+            radky.append(f'{nazev}_bucket{{{stitky_text(stitky + (("le", "+Inf"),))}}} {h["pocet"]}')
+            radky.append(f"{nazev}_sum{{{stitky_text(stitky)}}} {h['soucet']:.6f}")
+            radky.append(f"{nazev}_count{{{stitky_text(stitky)}}} {h['pocet']}")
+    return "\n".join(radky) + "\n"
+
+def soubor_metrik():
+    return os.path.join(METRIKY_ADRESAR, f"pruvodce_{os.getpid()}.prom")
+
+def smaz_metriky():
+    """Po skončení procesu soubor smažeme, jinak by node_exporter dál vystavoval zamrzlé řady mrtvého PID"""
+    try: os.remove(soubor_metrik())
+    except OSError: pass
+
+def exportuj_metriky():
+    """Zapíše metriky procesu do <METRIKY_ADRESAR>/pruvodce_<pid>.prom (pro node_exporter textfile collector)"""
+    m = metriky()
+    ted = time.time()
+    with m["zamek"]:
+        if ted - m["zapsano"] < METRIKY_INTERVAL: return
+        m["zapsano"] = ted
+    os.makedirs(METRIKY_ADRESAR, exist_ok=True)
+    cesta = soubor_metrik()
+    docasna = f"{cesta}.{threading.get_ident()}.tmp"
+    with open(docasna, "w") as f: f.write(metriky_text())
+    os.replace(docasna, cesta)
+
+# --- 0b. LÍNÉ IMPORTY 💤 ---
+# Intro a education datový stack nepotřebují; nový worker tak landing page vrátí bez čekání na pandas/yfinance
+class LinyModul:
+    """Zástupce modulu, který ho naimportuje až při prvním použití (doba -> pruvodce_import_seconds{modul=...})"""
+    def __init__(self, nazev):
+        self._nazev = nazev
+        self._modul = None
+
+    def __getattr__(self, atribut):
+        if self._modul is None:
+            self._modul = sys.modules.get(self._nazev)
+            if self._modul is None:
+                with mereni("pruvodce_import_seconds", modul=self._nazev):
+                    self._modul = importlib.import_module(self._nazev)
+        return getattr(self._modul, atribut)
+
+pd = LinyModul("pandas")
+np = LinyModul("numpy")
+yf = LinyModul("yfinance")
 
 # --- 0. POMOCNÉ FUNKCE PRO OBRÁZKY 🖼️ ---
-def get_img_as_base64(file_path):
-    """Načte lokální obrázek a převede ho na base64 pro HTML zobrazení"""
-    if not os.path.exists(file_path):
+# Obrázky jdou do static/assety/ se hashem obsahu v názvu (server.enableStaticServing v .streamlit/config.toml),
+# reruny tak posílají jen krátké URL místo base64 v HTML. Streamlit k nim neposílá Cache-Control (jen ETag
+# a Last-Modified), takže prohlížeč je drží jen podle vlastní heuristiky a pak se serveru ptá, jestli se nezměnily.
+STATIC_ADRESAR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "assety")
+STATIC_URL = "app/static/assety"
+OBRAZEK_AKCIE_URL = "https://financialmodelingprep.com/image-stock/{ticker}.png"
+OBRAZKY_TIMEOUT = 5 # Max. sekund na stažení jednoho loga firmy
+OBRAZKY_MAX_VLAKEN = 4 # Kolik log firem stahujeme souběžně
+OBRAZKY_NEGATIVNI_TTL = 3600 # Jak dlouho (s) znovu nestahujeme logo, jehož stažení selhalo
+PNG_HLAVICKA = b"\x89PNG\r\n\x1a\n"
+
+def uloz_asset(data, nazev, pripona):
+    """Uloží bajty jako static/assety/<nazev>.<hash>.<pripona> a vrátí jejich URL"""
+    soubor = f"{nazev}.{hashlib.sha256(data).hexdigest()[:12]}.{pripona}"
+    cesta = os.path.join(STATIC_ADRESAR, soubor)
+    if not os.path.exists(cesta):
+        os.makedirs(STATIC_ADRESAR, exist_ok=True)
+        docasna = f"{cesta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(docasna, "wb") as f: f.write(data)
+        os.replace(docasna, cesta)
+    return f"{STATIC_URL}/{soubor}"
+
+@st.cache_resource(show_spinner=False)
+@merene
+def logo_partnera(file_path):
+    """URL loga partnera (jednou za proces); když static/ nejde zapsat, data URI jako dřív"""
+    if not file_path or not os.path.exists(file_path):
         return None
     with open(file_path, "rb") as f:
         data = f.read()
-    return base64.b64encode(data).decode()
+    try: return uloz_asset(data, os.path.splitext(os.path.basename(file_path))[0], "png")
+    except OSError: return f"data:image/png;base64,{base64.b64encode(data).decode()}"
+
+def je_png(cesta):
+    with open(cesta, "rb") as f: return f.read(len(PNG_HLAVICKA)) == PNG_HLAVICKA
+
+@st.cache_resource(show_spinner=False)
+def obrazky_akcii():
+    """Sdílené v procesu: ticker -> URL lokální kopie loga (i z minulých běhů), rozpracovaná a neúspěšná stažení"""
+    url = {}
+    if os.path.isdir(STATIC_ADRESAR):
+        for soubor in sorted(os.listdir(STATIC_ADRESAR)):
+            if soubor.startswith("akcie-") and soubor.endswith(".png") and je_png(os.path.join(STATIC_ADRESAR, soubor)):
+                url[soubor[len("akcie-"):].rsplit(".", 2)[0]] = f"{STATIC_URL}/{soubor}"
+    return {"zamek": threading.Lock(), "url": url, "stahuje": set(), "selhalo": {}}
+
+@st.cache_resource(show_spinner=False)
+def obrazky_pool():
+    return ThreadPoolExecutor(max_workers=OBRAZKY_MAX_VLAKEN, thread_name_prefix="obrazky")
+
+def zrcadli_obrazek(ticker):
+    """Stáhne logo firmy do static/ (běží na pozadí)"""
+    stav = obrazky_akcii()
+    try:
+        with urllib.request.urlopen(OBRAZEK_AKCIE_URL.format(ticker=ticker), timeout=OBRAZKY_TIMEOUT) as odpoved:
+            typ, data = odpoved.headers.get_content_type(), odpoved.read()
+        # Chybová stránka (HTML s kódem 200) by se jinak uložila a servírovala jako logo
+        if not typ.startswith("image/") or not data.startswith(PNG_HLAVICKA): raise ValueError(f"{ticker}: {typ} není PNG")
+        url = uloz_asset(data, f"akcie-{ticker}", "png")
+        with stav["zamek"]: stav["url"][ticker] = url
+        pocitej("pruvodce_obrazky_total", vysledek="stazeno")
+    except Exception:
+        with stav["zamek"]: stav["selhalo"][ticker] = time.time()
+        pocitej("pruvodce_obrazky_total", vysledek="chyba")
+    finally:
+        with stav["zamek"]: stav["stahuje"].discard(ticker)
+
+def obrazek_akcie(ticker):
+    """URL loga firmy: lokální kopie, a dokud není stažená, originál (kopie se stahuje na pozadí)"""
+    stav = obrazky_akcii()
+    with stav["zamek"]:
+        if ticker in stav["url"]: return stav["url"][ticker]
+        if ticker not in stav["stahuje"] and time.time() - stav["selhalo"].get(ticker, 0) > OBRAZKY_NEGATIVNI_TTL:
+            stav["stahuje"].add(ticker)
+            obrazky_pool().submit(zrcadli_obrazek, ticker)
+    return OBRAZEK_AKCIE_URL.format(ticker=ticker)
+
+def img(url, sirka):
+    # st.image by relativní URL četl jako cestu na disku (a importuje numpy)
+    st.markdown(f'<img src="{url}" width="{sirka}">', unsafe_allow_html=True)
 
 # --- 1. CONFIG & CHAMELEON SETUP 🦎 ---
 PARTNERS = {
@@ -63,9 +271,13 @@ current_partner = PARTNERS[active_partner_key]
 
 st.set_page_config(page_title=current_partner["name"], page_icon=current_partner["logo_emoji"], layout="wide")
 
-st.markdown(f"""
+@st.cache_resource(show_spinner=False)
+def css_partnera(klic):
+    """Barevný <style> blok partnera, sestavený jednou za proces"""
+    partner = PARTNERS[klic]
+    return f"""
     <style>
-    .stApp {{ background: linear-gradient(to bottom right, {current_partner['color_bg']}, #111); color: #e0e0e0; }}
+    .stApp {{ background: linear-gradient(to bottom right, {partner['color_bg']}, #111); color: #e0e0e0; }}
     .card-highlight {{ background-color: rgba(255, 255, 255, 0.05); padding: 15px; border-radius: 10px; border: 1px solid rgba(255, 255, 255, 0.1); margin-bottom: 10px; }}
     
     /* Anti-Panic Big Card */
@@ -76,16 +288,57 @@ st.markdown(f"""
     .panic-growth {{ background-color: rgba(5, 150, 105, 0.2); border-color: #059669; color: #34d399; }}
     .panic-discount {{ background-color: rgba(37, 99, 235, 0.2); border-color: #3b82f6; color: #60a5fa; }}
     
-    div.stButton > button:first-child {{ background-color: {current_partner['color_primary']} !important; color: white !important; border: none !important; }}
+    div.stButton > button:first-child {{ background-color: {partner['color_primary']} !important; color: white !important; border: none !important; }}
     </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(css_partnera(active_partner_key), unsafe_allow_html=True)
 
 if 'page' not in st.session_state: st.session_state.page = "intro" 
 if 'moje_portfolio' not in st.session_state: st.session_state.moje_portfolio = []
 if 'user_name' not in st.session_state: st.session_state.user_name = "Návštěvník"
 if 'lead_captured' not in st.session_state: st.session_state.lead_captured = False
+if 'id_session' not in st.session_state: st.session_state.id_session = uuid.uuid4().hex
 
-KURZ_USD_CZK = 23.50
+KURZ_USD_CZK = 23.50 # Záložní kurz, když řada z Yahoo není k dispozici
+KURZ_TICKER = "CZK=X" # Denní kurz USD/CZK na Yahoo, ukládá se do skladu historie jako ceny
+SCENARE_NALADY = tuple(round(0.5 + 0.1 * i, 1) for i in range(11)) # Diskrétní hodnoty slideru "Nálada trhu"
+KARET_NA_STRANKU = 4 # Kolik karet výsledků načteme najednou
+GRAF_BODU_KARTA = 60 # Kolik bodů stačí na malý graf karty (~1 bod na 10 px šířky)
+GRAF_BODU_HISTORIE = 120 # Kolik bodů posíláme do grafu historie portfolia přes celou šířku dashboardu
+MESICE = ["Leden", "Únor", "Březen", "Duben", "Květen", "Červen", "Červenec", "Srpen", "Září", "Říjen", "Listopad", "Prosinec"]
+YAHOO_MAX_VLAKEN = 8 # Kolik tickerů stahujeme z Yahoo souběžně
+YAHOO_TIMEOUT = 3 # Max. sekund na jeden dotaz na Yahoo
+YAHOO_ROZPOCET = 5 # Max. sekund, kolik stránka čeká na všechny tickery dohromady
+NEGATIVNI_TTL = 120 # Jak dlouho (s) Yahoo neptáme na ticker, pro který selhalo
+JISTIC_LIMIT = 5 # Po kolika selháních v řadě jistič vypadne
+JISTIC_PAUZA = 300 # Na kolik sekund jistič posílá vše na zálohu
+CACHE_TTL = 3600 # Po kolika sekundách je historie cen zastaralá
+OBNOVA_LEASE = 120 # Jak dlouho (s) má jeden worker výhradní právo obnovovat ticker
+HISTORIE_PAMET_MAX = 300 # Kolik historií tickerů držíme v paměti procesu před skladem
+ZAHRIVAC_CACHE = os.environ.get("ZAHRIVAC_CACHE", "0") == "1" # Zapne obnovu cen na pozadí
+ZAHRIVAC_PREDSTIH = 600 # O kolik sekund dřív než vyprší CACHE_TTL ticker obnovíme
+ZAHRIVAC_PRODLEVA = 2.0 # Průměrná pauza (s) mezi dvěma dotazy na Yahoo
+ZAHRIVAC_INTERVAL = 60 # Průměrná pauza (s) mezi dvěma koly kontroly
+SLEDOVANI_TTL = 3600 # Po kolika sekundách bez běhu (zavřená karta, vypršená session) přestaneme hřát tickery session
+ULOZISTE_ZAPISU = os.environ.get("ULOZISTE_ZAPISU", "csv") # "csv" (lokálně) nebo "sheets" (Google Sheets)
+ZAPIS_ADRESAR = os.environ.get("ZAPIS_ADRESAR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+SHEETS_KLIC = os.environ.get("SHEETS_KLIC") # ID tabulky v Google Sheets
+GOOGLE_CREDENTIALS = os.environ.get("GOOGLE_CREDENTIALS", "credentials.json") # JSON klíč service accountu
+ZAPIS_INTERVAL = 5 # Kolik sekund sbíráme řádky do jedné dávky
+ZAPIS_MAX_DAVKA = 500 # Max. řádků v jedné dávce
+ZAPIS_POKUSY = 5 # Kolikrát zkusíme dávku zapsat, než ji odložíme do lokálního CSV
+ZAPIS_KONEC_TIMEOUT = 10 # Kolik sekund při ukončení procesu čekáme, než zapisovač dopíše rozpracovanou dávku
+PDF_FONT = os.environ.get("PDF_FONT", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf") # TTF s češtinou (bez něj bez diakritiky)
+PDF_CACHE_MAX = 200 # Kolik hotových PDF reportů držíme v paměti
+KOULE_ROKY = 20 # Na kolik let dopředu projekce Sněhové koule počítá
+KOULE_CEST = 10_000 # Kolik náhodných vývojů trhu se simuluje
+KOULE_DAVKA = 1_000 # Po kolika cestách simulace běží (drží paměť malou i pro desítky pozic)
+KOULE_RUST = 0.06 # Očekávaný roční růst cen (bez dividend); roční historie je na odhad trendu moc krátká
+KOULE_PERCENTILY = (10, 50, 90) # Pásma grafu: pesimistický, střední a optimistický vývoj
+VOLATILITA_ZALOHA = 0.25 # Roční volatilita firmy, pro kterou ve skladu nemáme historii
+KATALOG_SOUBOR = os.environ.get("KATALOG_SOUBOR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "akcie.csv"))
+HISTORIE_DB = os.environ.get("HISTORIE_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "historie.sqlite"))
 
 # --- 2. DATA ENGINE (Yahoo + Simulace) ---
 
@@ -93,46 +346,341 @@ def apply_market_sentiment(price):
     factor = st.session_state.get('market_factor', 1.0) 
     return price * factor
 
+def cena_pri_nalade(nasobek, posun):
+    """Cena (i celé pole/křivka) při aktuální náladě trhu z koeficientů z nacti_data_hromadne"""
+    return apply_market_sentiment(nasobek) + posun
+
 # Simulace (Záloha)
-def ziskej_data_simulace(ticker, styl):
-    seed = sum(ord(c) for c in ticker)
-    np.random.seed(seed)
-    base_price = np.random.randint(50, 400)
-    base_price = apply_market_sentiment(base_price)
-    points = 30 
-    trend = np.linspace(0, 50 if styl == "Růst" else 10, points)
-    volatilita = np.random.normal(0, 5 if styl == "Růst" else 2, points)
-    krivka = [float(x) for x in (base_price + trend + volatilita)]
-    graf_data = pd.DataFrame(krivka, columns=['Close'])
-    return round(krivka[-1], 2), "USD", graf_data
+SIMULACE_BODU = 30
+
+@st.cache_resource(show_spinner=False)
+def simulace_cache():
+    return {}
+
+@merene
+def simuluj_zakladni_krivky(polozky):
+    """Pro seznam (ticker, styl) vrátí (základní ceny, odchylky křivek) bez vlivu nálady trhu"""
+    cache = simulace_cache()
+    chybi = [k for k in dict.fromkeys(polozky) if k not in cache]
+    if chybi:
+        # Každý ticker má vlastní Generator -> stejná křivka bez ohledu na vlákno i složení dávky
+        generatory = [np.random.default_rng(sum(ord(c) for c in t)) for t, _ in chybi]
+        rust = np.array([styl == "Růst" for _, styl in chybi])
+        zaklad = np.array([g.integers(50, 400) for g in generatory], dtype=float)
+        sum_ = np.stack([g.standard_normal(SIMULACE_BODU) for g in generatory])
+        trend = np.where(rust, 50, 10)[:, None] * np.linspace(0, 1, SIMULACE_BODU)
+        odchylky = trend + np.where(rust, 5, 2)[:, None] * sum_
+        for i, k in enumerate(chybi): cache[k] = (zaklad[i], odchylky[i])
+    return np.array([cache[k][0] for k in polozky]), np.array([cache[k][1] for k in polozky]).reshape(len(polozky), SIMULACE_BODU)
+
+# Sdílený sklad historie (SQLite na disku, společný pro všechny workery)
+@st.cache_resource(show_spinner=False)
+def pripravit_historie_db():
+    os.makedirs(os.path.dirname(HISTORIE_DB), exist_ok=True)
+    with closing(sqlite3.connect(HISTORIE_DB, timeout=30)) as con:
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("CREATE TABLE IF NOT EXISTS ceny (ticker TEXT, datum TEXT, close REAL, PRIMARY KEY (ticker, datum))")
+        con.execute("CREATE TABLE IF NOT EXISTS stav (ticker TEXT PRIMARY KEY, aktualizovano REAL, obnova_do REAL)")
+        con.commit()
+    return HISTORIE_DB
+
+def historie_db():
+    return closing(sqlite3.connect(pripravit_historie_db(), timeout=30))
+
+@st.cache_resource(show_spinner=False)
+def historie_pamet():
+    """Sdílené v procesu: ticker -> (čas aktualizace ve skladu, hist); DataFrame se nesmí měnit"""
+    return {"zamek": threading.Lock(), "historie": OrderedDict()}
+
+def nacti_historii(ticker):
+    """Vrátí (hist, čas poslední aktualizace) ze skladu, nebo (None, None).
+    Dokud se ve skladu nezmění čas aktualizace, vrací hotový DataFrame z paměti (jen jeden dotaz na stav)."""
+    pamet = historie_pamet()
+    with historie_db() as con:
+        radek = con.execute("SELECT aktualizovano FROM stav WHERE ticker = ?", (ticker,)).fetchone()
+        if not radek: return None, None
+        with pamet["zamek"]:
+            ulozeno = pamet["historie"].get(ticker)
+            if ulozeno and ulozeno[0] == radek[0]:
+                pamet["historie"].move_to_end(ticker)
+                return ulozeno[1], radek[0]
+        hist = pd.read_sql_query("SELECT datum, close FROM ceny WHERE ticker = ? ORDER BY datum", con, params=(ticker,))
+    if hist.empty: return None, None
+    hist = pd.DataFrame({"Close": hist["close"].values}, index=pd.DatetimeIndex(pd.to_datetime(hist["datum"]), name="Date"))
+    with pamet["zamek"]:
+        pamet["historie"][ticker] = (radek[0], hist)
+        pamet["historie"].move_to_end(ticker)
+        while len(pamet["historie"]) > HISTORIE_PAMET_MAX: pamet["historie"].popitem(last=False)
+    return hist, radek[0]
+
+def uloz_historii(ticker, hist, nahradit=False):
+    """Uloží ceny do skladu; nahradit=True nejdřív smaže všechny staré řádky tickeru (po přepočtu historie)"""
+    radky = [(ticker, d, float(c)) for d, c in zip(hist.index.strftime("%Y-%m-%d"), hist['Close'])]
+    hranice = (pd.Timestamp.now() - pd.Timedelta(days=366)).strftime("%Y-%m-%d")
+    with historie_db() as con, con:
+        if nahradit: con.execute("DELETE FROM ceny WHERE ticker = ?", (ticker,))
+        con.executemany("INSERT OR REPLACE INTO ceny (ticker, datum, close) VALUES (?, ?, ?)", radky)
+        con.execute("DELETE FROM ceny WHERE ticker = ? AND datum < ?", (ticker, hranice))
+        con.execute("INSERT OR REPLACE INTO stav (ticker, aktualizovano, obnova_do) VALUES (?, ?, NULL)", (ticker, time.time()))
+
+def stav_historie():
+    """Vrátí dict ticker -> (čas poslední aktualizace, poslední uložené datum)"""
+    with historie_db() as con:
+        radky = con.execute("SELECT s.ticker, s.aktualizovano, MAX(c.datum) FROM stav s LEFT JOIN ceny c ON c.ticker = s.ticker GROUP BY s.ticker").fetchall()
+    return {t: (akt, datum) for t, akt, datum in radky}
+
+def zamkni_obnovu(ticker):
+    """Atomicky si zabere obnovu tickeru, aby ho z Yahoo nestahovalo víc workerů naráz"""
+    ted = time.time()
+    with historie_db() as con, con:
+        con.execute("INSERT OR IGNORE INTO stav (ticker, aktualizovano, obnova_do) VALUES (?, 0, NULL)", (ticker,))
+        cur = con.execute("UPDATE stav SET obnova_do = ? WHERE ticker = ? AND (obnova_do IS NULL OR obnova_do < ?)", (ted + OBNOVA_LEASE, ticker, ted))
+        return cur.rowcount == 1
+
+def uvolni_obnovu(ticker):
+    with historie_db() as con, con:
+        con.execute("UPDATE stav SET obnova_do = NULL WHERE ticker = ?", (ticker,))
+
+# Jistič a negativní cache (sdílené v procesu)
+@st.cache_resource(show_spinner=False)
+def yahoo_zdravi():
+    return {"zamek": threading.Lock(), "selhani_tickeru": {}, "selhani_v_rade": 0, "jistic_do": 0.0}
+
+def yahoo_povoleno(ticker):
+    """False, když je jistič vypadlý nebo ticker nedávno selhal"""
+    z = yahoo_zdravi()
+    ted = time.time()
+    with z["zamek"]:
+        return ted >= z["jistic_do"] and ted >= z["selhani_tickeru"].get(ticker, 0)
+
+def zaznamenej_yahoo(ticker, uspech):
+    z = yahoo_zdravi()
+    with z["zamek"]:
+        if uspech:
+            z["selhani_v_rade"] = 0
+            z["selhani_tickeru"].pop(ticker, None)
+        else:
+            z["selhani_v_rade"] += 1
+            z["selhani_tickeru"][ticker] = time.time() + NEGATIVNI_TTL
+            # Počítadlo po vypadnutí nenulujeme: první chyba po pauze jistič hned znovu vyhodí
+            if z["selhani_v_rade"] >= JISTIC_LIMIT:
+                z["jistic_do"] = time.time() + JISTIC_PAUZA
 
 # Reálná Data
-@st.cache_data(ttl=3600, show_spinner=False) 
-def ziskej_data_yahoo(ticker):
+def stahni_historii_yahoo(ticker, od=None):
     try:
         stock = yf.Ticker(ticker)
-        hist = stock.history(period="1y")
-        if hist.empty: return None
-        cena = hist['Close'].iloc[-1]
-        graf_data = hist[['Close']].reset_index(drop=True)
-        return round(float(cena), 2), "USD", graf_data
+        if od is None: hist = stock.history(period="1y", timeout=YAHOO_TIMEOUT)
+        else: hist = stock.history(start=od, timeout=YAHOO_TIMEOUT)
     except Exception:
-        return None
+        zaznamenej_yahoo(ticker, False)
+        raise
+    # yfinance chyby sítě často jen zaloguje a vrátí prázdná data
+    zaznamenej_yahoo(ticker, not hist.empty)
+    return hist
+
+def historie_prepocitana(ticker, od, hist):
+    """True, když Yahoo od posledního stažení přepočítal ceny (split, dividenda) a nové dny
+    by na uložené nenavazovaly: překryvný den od nesedí nebo je v datech split/dividenda"""
+    for sloupec in ("Stock Splits", "Dividends"):
+        if sloupec in hist and (hist[sloupec].fillna(0) != 0).any(): return True
+    nove = hist['Close'][hist.index.strftime("%Y-%m-%d") == od]
+    with historie_db() as con:
+        radek = con.execute("SELECT close FROM ceny WHERE ticker = ? AND datum = ?", (ticker, od)).fetchone()
+    return nove.empty or radek is None or not np.isclose(float(nove.iloc[0]), radek[0], rtol=1e-4)
+
+def obnov_historii(ticker, od=None):
+    """Běží na pozadí: dotáhne jen dny od posledního uloženého data (včetně, kvůli dnešní ceně)"""
+    try:
+        hist = stahni_historii_yahoo(ticker, od)
+        nahradit = od is not None and not hist.empty and historie_prepocitana(ticker, od, hist)
+        # Po splitu/dividendě stáhneme celý rok znovu, jinak by v řadě zůstal skok mezi starými a novými cenami
+        if nahradit: hist = stahni_historii_yahoo(ticker)
+        # Prázdná data = výpadek Yahoo: neoznačíme starou historii za čerstvou, jen uvolníme lease
+        if hist.empty: uvolni_obnovu(ticker)
+        else: uloz_historii(ticker, hist, nahradit)
+    except Exception:
+        uvolni_obnovu(ticker)
+
+@st.cache_resource(show_spinner=False)
+def obnova_pool():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="obnova")
+
+# Zahřívač cache (jedno vlákno na proces, workery se hlídají přes lease)
+@st.cache_resource(show_spinner=False)
+def sledovane_tickery():
+    """Tickery z portfolií sessions v tomto procesu: id session -> (čas posledního běhu, tickery), mění se pod zámkem"""
+    return {"zamek": threading.Lock(), "sessions": {}}
+
+def sleduj_portfolio():
+    """Obnoví tickery této session pro zahřívač (volá se při každém běhu, prázdné portfolio session odhlásí)"""
+    tickery = frozenset(p['ticker'] for p in st.session_state.moje_portfolio)
+    sledovane = sledovane_tickery()
+    with sledovane["zamek"]:
+        if tickery: sledovane["sessions"][st.session_state.id_session] = (time.time(), tickery)
+        else: sledovane["sessions"].pop(st.session_state.id_session, None)
+
+def aktivni_tickery():
+    """Tickery sessions, které běžely za posledních SLEDOVANI_TTL sekund; starší záznamy zahodí"""
+    hranice = time.time() - SLEDOVANI_TTL
+    sledovane = sledovane_tickery()
+    with sledovane["zamek"]:
+        for id_session in [s for s, (cas, _) in sledovane["sessions"].items() if cas < hranice]: del sledovane["sessions"][id_session]
+        return set().union(*(tickery for _, tickery in sledovane["sessions"].values()))
 
-# Hlavní chytrá funkce
-def ziskej_data_smart(ticker, styl):
-    raw_data = ziskej_data_yahoo(ticker)
-    if raw_data:
-        cena_real, mena, graf = raw_data
-        cena_simulated = apply_market_sentiment(cena_real)
-        return cena_simulated, mena, graf
+def zahrivac_cache(tickery):
+    while True:
+        try:
+            stav = stav_historie()
+            for ticker in sorted(set(tickery) | aktivni_tickery()):
+                aktualizovano, posledni_datum = stav.get(ticker, (0, None))
+                if time.time() - aktualizovano < CACHE_TTL - ZAHRIVAC_PREDSTIH: continue
+                if not yahoo_povoleno(ticker) or not zamkni_obnovu(ticker): continue
+                obnov_historii(ticker, posledni_datum)
+                time.sleep(ZAHRIVAC_PRODLEVA * random.uniform(0.5, 1.5))
+        except Exception:
+            pass
+        time.sleep(ZAHRIVAC_INTERVAL * random.uniform(0.8, 1.2))
+
+@st.cache_resource(show_spinner=False)
+def spust_zahrivac(tickery):
+    vlakno = threading.Thread(target=zahrivac_cache, args=(tickery,), name="zahrivac-cache", daemon=True)
+    vlakno.start()
+    return vlakno
+
+def historie_yahoo(ticker):
+    """Historie (DataFrame s Close a datem v indexu) přes sdílený sklad se stale-while-revalidate, None = nedostupná"""
+    hist, aktualizovano = nacti_historii(ticker)
+    if hist is None:
+        if not yahoo_povoleno(ticker):
+            pocitej("pruvodce_cache_total", vysledek="blokovano")
+            return None
+        pocitej("pruvodce_cache_total", vysledek="miss")
+        try:
+            hist = stahni_historii_yahoo(ticker)
+            if hist.empty: return None
+            uloz_historii(ticker, hist)
+            hist = nacti_historii(ticker)[0] # Stejný tvar indexu (dny bez časové zóny) jako ze skladu
+        except Exception:
+            return None
+    elif time.time() - aktualizovano > CACHE_TTL:
+        pocitej("pruvodce_cache_total", vysledek="stale")
+        if yahoo_povoleno(ticker) and zamkni_obnovu(ticker):
+            # Stale-while-revalidate: hned vrátíme staré ceny, obnova doběhne na pozadí
+            obnova_pool().submit(obnov_historii, ticker, hist.index[-1].strftime("%Y-%m-%d"))
     else:
-        return ziskej_data_simulace(ticker, styl)
+        pocitej("pruvodce_cache_total", vysledek="hit")
+    return hist
+
+@merene
+def ziskej_data_yahoo(ticker):
+    hist = historie_yahoo(ticker)
+    if hist is None: return None
+    cena = hist['Close'].iloc[-1]
+    graf_data = hist[['Close']] # Datum v indexu zůstává (historie portfolia, převod kurzem daného dne)
+    return round(float(cena), 2), "USD", graf_data
+
+# Hromadné načtení (jedno kolo pro celou stránku)
+@st.cache_resource(show_spinner=False)
+def yahoo_pool():
+    return ThreadPoolExecutor(max_workers=YAHOO_MAX_VLAKEN, thread_name_prefix="yahoo")
+
+@merene
+def nacti_data_hromadne(polozky):
+    """Pro seznam (ticker, styl) stáhne všechny tickery souběžně a vrátí (dict ticker -> (nasobek, posun, mena, graf),
+    kurzy USD/CZK), kde cena při náladě trhu f je nasobek * f + posun"""
+    styly = dict(polozky)
+    tickery = list(styly)
+    # Paralelní volání plní stejný sklad historie jako ziskej_data_yahoo
+    futures = {t: yahoo_pool().submit(ziskej_data_yahoo, t) for t in tickery}
+    # Kurz jde ve stejném kole, takže stránka čeká jen na nejpomalejší ticker, ne na dvě kola za sebou
+    kurz = yahoo_pool().submit(historie_yahoo, KURZ_TICKER)
+    # Co nestihne YAHOO_ROZPOCET, jde pro tento běh na simulaci (stahování doběhne na pozadí)
+    wait([*futures.values(), kurz], timeout=YAHOO_ROZPOCET)
+    raw = {t: f.result() if f.done() else None for t, f in futures.items()}
+    sim = [(t, styly[t]) for t in tickery if not raw[t]]
+    if sim: pocitej("pruvodce_fallback_total", len(sim), duvod="simulace")
+    zaklad, odchylky = simuluj_zakladni_krivky(sim)
+    # Nálada trhu posouvá jen výchozí cenu, takže je to levná transformace hotových křivek
+    krivky = cena_pri_nalade(zaklad[:, None], odchylky)
+    vysledky = {t: (z, o[-1], "USD", pd.DataFrame(k, columns=['Close'])) for (t, _), z, o, k in zip(sim, zaklad, odchylky, krivky)}
+    for t in tickery:
+        if raw[t]:
+            cena_real, mena, graf = raw[t]
+            vysledky[t] = (cena_real, 0.0, mena, graf)
+    return vysledky, kurzy_z_historie(kurz)
+
+# Kurz USD/CZK (řada po dnech, převod celých polí najednou)
+def kurzy_usd_czk():
+    """Denní kurzy USD/CZK jako Series s datem v indexu, None = offline (platí KURZ_USD_CZK).
+    Stránky s cenami berou kurz z nacti_data_hromadne; tohle je pro místa bez hromadného načtení."""
+    future = yahoo_pool().submit(historie_yahoo, KURZ_TICKER)
+    wait([future], timeout=YAHOO_ROZPOCET)
+    return kurzy_z_historie(future)
+
+def kurzy_z_historie(future):
+    hist = future.result() if future.done() else None
+    if hist is None:
+        pocitej("pruvodce_fallback_total", duvod="kurz")
+        return None
+    return hist['Close']
+
+def aktualni_kurz(kurzy):
+    return float(kurzy.iloc[-1]) if kurzy is not None else KURZ_USD_CZK
+
+def na_czk(hodnoty_usd, kurzy):
+    """Převede USD (pole, Series nebo DataFrame) na Kč jedním násobením.
+    S datem v indexu platí kurz daného dne (poslední známý před ním), jinak aktuální kurz."""
+    if kurzy is not None and isinstance(getattr(hodnoty_usd, "index", None), pd.DatetimeIndex):
+        kurz = kurzy.reindex(kurzy.index.union(hodnoty_usd.index)).ffill().bfill().reindex(hodnoty_usd.index)
+        return hodnoty_usd.mul(kurz.to_numpy(), axis=0)
+    return hodnoty_usd * aktualni_kurz(kurzy)
+
+# Zmenšení grafů před odesláním do prohlížeče
+def zmensi_serii(hodnoty, body):
+    """Min/max bucketing: vrátí indexy bodů, které zachovají tvar i špičky série"""
+    y = np.asarray(hodnoty, dtype=float)
+    n = len(y)
+    if n <= body: return np.arange(n)
+    # První a poslední bod necháme vždy, zbytek rozdělíme do košů a z každého vezmeme min a max
+    kosu = max(1, (body - 2) // 2)
+    delka = -(-(n - 2) // kosu)
+    kosu = -(-(n - 2) // delka)
+    vnitrni = np.full(kosu * delka, np.nan)
+    vnitrni[:n - 2] = y[1:-1]
+    bloky = vnitrni.reshape(kosu, delka)
+    zacatky = 1 + np.arange(kosu) * delka
+    # Chybějící ceny (NaN) se do min/max nepočítají a koš, kde chybí všechny, vynecháme (nanargmin by spadl)
+    chybi = np.isnan(bloky)
+    plne = ~chybi.all(axis=1)
+    minima = np.where(chybi, np.inf, bloky).argmin(axis=1)
+    maxima = np.where(chybi, -np.inf, bloky).argmax(axis=1)
+    idx = np.concatenate(([0], (zacatky + minima)[plne], (zacatky + maxima)[plne], [n - 1]))
+    return np.unique(idx)
+
+@st.cache_data(max_entries=1000, show_spinner=False)
+def zmenseny_graf(ticker, verze, _graf_data, body=GRAF_BODU_KARTA):
+    """Zmenšená kopie grafu, cachovaná podle tickeru a verze dat (délka + poslední cena)"""
+    return _graf_data.iloc[zmensi_serii(_graf_data['Close'], body)]
 
-def get_position_status_rich(current_price, avg_buy_price):
+def graf_karty(ticker, graf_data, kurzy):
+    """Zmenšený graf karty v Kč (převádí se až zmenšený, je to pár desítek bodů)"""
+    return na_czk(zmenseny_graf(ticker, (len(graf_data), round(float(graf_data['Close'].iloc[-1]), 4)), graf_data), kurzy)
+
+# Předpočítané scénáře pro slider "Nálada trhu"
+def ceny_scenaru(data, tickery):
+    """Matice cen (tickery x SCENARE_NALADY) z výstupu nacti_data_hromadne"""
+    nasobky = np.array([data[t][0] for t in tickery], dtype=float)
+    posuny = np.array([data[t][1] for t in tickery], dtype=float)
+    return nasobky[:, None] * np.array(SCENARE_NALADY) + posuny[:, None]
+
+def index_scenare(faktor):
+    return int(np.abs(np.array(SCENARE_NALADY) - faktor).argmin())
+
+def get_position_status_rich(current_price, avg_buy_price, kurz=KURZ_USD_CZK):
     diff = current_price - avg_buy_price
     percent_change = (diff / avg_buy_price) * 100
-    val_diff_czk = int(diff * KURZ_USD_CZK)
+    val_diff_czk = int(diff * kurz)
     
     if percent_change >= 0:
         return {
@@ -151,91 +699,554 @@ def get_position_status_rich(current_price, avg_buy_price):
             "desc": "Trh ti nabízí stejnou firmu za méně peněz. Je to jako Black Friday."
         }
 
+# Ocenění portfolia (vše jako operace nad poli, cena se hledá 1x na ticker)
+def ocen_portfolio(portfolio):
+    """Seskupí pozice podle tickeru a vrátí dict polí (1 prvek = 1 ticker) + kalendář výplat po měsících.
+    Ceny a hodnoty jsou předpočítané i pro všechny SCENARE_NALADY (sloupce)."""
+    tickery, idx = np.unique(np.array([p['ticker'] for p in portfolio], dtype=str), return_inverse=True)
+    n = len(tickery)
+    ks = np.bincount(idx, weights=[p['ks'] for p in portfolio], minlength=n)
+    investovano = np.bincount(idx, weights=[p['investice_czk'] for p in portfolio], minlength=n)
+    naklad_usd = np.bincount(idx, weights=[p['ks'] * p['buy_price_usd'] for p in portfolio], minlength=n)
+
+    prvni = {}
+    for p in portfolio: prvni.setdefault(p['ticker'], p)
+    vynos = np.array([prvni[t].get('yield') or 0 for t in tickery], dtype=float)
+    maska_mesicu = np.array([[m in (prvni[t].get('months') or []) for m in MESICE] for t in tickery], dtype=float).reshape(n, len(MESICE))
+
+    data, kurzy = nacti_data_hromadne([(t, "Neznámý") for t in tickery])
+    ceny_scenare = ceny_scenaru(data, tickery).reshape(n, len(SCENARE_NALADY))
+    kurz = aktualni_kurz(kurzy)
+    hodnota_scenare = ks[:, None] * ceny_scenare * kurz
+    aktualni = index_scenare(st.session_state.get('market_factor', 1.0))
+    ceny_usd = ceny_scenare[:, aktualni]
+    hodnota_czk = hodnota_scenare[:, aktualni]
+
+    divi_rocne = investovano * vynos / 100
+    pocet_vyplat = maska_mesicu.sum(axis=1)
+    divi_na_vyplatu = np.divide(divi_rocne, pocet_vyplat, out=np.zeros(n), where=pocet_vyplat > 0)
+    return {
+        "tickery": tickery,
+        "nazvy": [prvni[t]['name'] for t in tickery],
+        "ks": ks,
+        "investovano": investovano,
+        "prumerna_nakupka_usd": np.divide(naklad_usd, ks, out=np.zeros(n), where=ks > 0),
+        "ceny_usd": ceny_usd,
+        "kurz": kurz,
+        "kurzy": kurzy,
+        "grafy": [data[t][3] for t in tickery],
+        "hodnota_czk": hodnota_czk,
+        "zisk_czk": hodnota_czk - investovano,
+        "divi_rocne": divi_rocne,
+        "kalendar": divi_na_vyplatu @ maska_mesicu,
+        "ceny_scenare": ceny_scenare,
+        "hodnota_scenare": hodnota_scenare,
+        "vynos": vynos,
+    }
+
+# Historie hodnoty portfolia (zarovnaná matice dny x tickery, váhy = ks)
+def historie_portfolia(portfolio):
+    """Hodnota dnešních pozic v Kč po dnech -> (Series, tickery bez historie).
+    Sloupce matice se drží v session a přepočítá se jen ticker, který je nový nebo má nová data
+    (nový kurz USD/CZK, i přechod ze záložního kurzu na řadu z Yahoo, přepočítá všechny)."""
+    stav = st.session_state.setdefault('historie_portfolia', {"verze": {}, "matice": None})
+    tickery, bez_historie = [], []
+    for t, graf in zip(portfolio["tickery"], portfolio["grafy"]):
+        if isinstance(graf.index, pd.DatetimeIndex): tickery.append(str(t))
+        else: bez_historie.append(str(t)) # simulovaná záloha nemá skutečná data
+    kurzy = portfolio["kurzy"]
+    verze_kurzu = None if kurzy is None else (len(kurzy), kurzy.index[-1], float(kurzy.iloc[-1]))
+    verze = {t: (len(g), g.index[-1], float(g['Close'].iloc[-1]), verze_kurzu) for t, g in zip(portfolio["tickery"], portfolio["grafy"]) if t in tickery}
+    zmenene = [t for t in tickery if stav["verze"].get(t) != verze[t]]
+    matice = stav["matice"]
+    if zmenene:
+        grafy = dict(zip(portfolio["tickery"], portfolio["grafy"]))
+        nove = pd.concat({t: na_czk(grafy[t]['Close'], kurzy) for t in zmenene}, axis=1)
+        matice = nove if matice is None else matice.drop(columns=zmenene, errors="ignore").join(nove, how="outer")
+        stav["verze"].update({t: verze[t] for t in zmenene})
+        stav["matice"] = matice
+    if not tickery: return None, bez_historie
+    ks = np.array([k for t, k in zip(portfolio["tickery"], portfolio["ks"]) if t in tickery])
+    # Svátky a chybějící dny doplníme poslední cenou; začínáme dnem, kdy mají data všechny pozice
+    zarovnana = matice[tickery].ffill().dropna()
+    return pd.Series(zarovnana.to_numpy() @ ks, index=zarovnana.index, name="Hodnota (Kč)"), bez_historie
+
+# Projekce Sněhové koule (Monte Carlo přes všechny cesty najednou)
+def kovariance_vynosu(tickery):
+    """Roční kovarianční matice log-výnosů z historie ve skladu (řady zarovnané podle data).
+    Firmy bez historie dostanou VOLATILITA_ZALOHA a nulovou korelaci."""
+    serie = {}
+    for t in tickery:
+        hist = nacti_historii(t)[0]
+        if hist is not None and len(hist) > 20: serie[t] = hist['Close']
+    kovariance = pd.DataFrame(np.nan, index=list(tickery), columns=list(tickery))
+    if serie:
+        vynosy = np.log(pd.DataFrame(serie)).diff().iloc[1:]
+        kovariance = (vynosy.cov(min_periods=20) * 252).reindex(index=kovariance.index, columns=kovariance.columns)
+    k = kovariance.to_numpy()
+    chybi = np.isnan(np.diag(k))
+    k = np.nan_to_num(k)
+    k[chybi, chybi] = VOLATILITA_ZALOHA ** 2
+    return k
+
+@st.cache_data(max_entries=1000, ttl=CACHE_TTL, show_spinner=False)
+@merene
+def snehova_koule(tickery, investovano, vynos, roky=KOULE_ROKY, cest=KOULE_CEST):
+    """Projekce hodnoty portfolia (drží se, dividendy se reinvestují) -> (roky, percentily KOULE_PERCENTILY x roky).
+    Memo podle složení portfolia; seed je z něj odvozený, takže graf i PDF ukazují stejná čísla."""
+    investovano = np.asarray(investovano, dtype=float)
+    rok_ted = datetime.now().year
+    if investovano.sum() <= 0: return list(range(rok_ted, rok_ted + roky + 1)), np.zeros((len(KOULE_PERCENTILY), roky + 1))
+    kovariance = kovariance_vynosu(tickery)
+    # Korelované roční šoky: z @ L.T, kde L L.T = kovariance (přes eigh, snese i ne zcela pozitivně definitní odhad)
+    vlastni_cisla, vlastni_vektory = np.linalg.eigh(kovariance)
+    L = vlastni_vektory * np.sqrt(np.clip(vlastni_cisla, 0, None))
+    drift = np.log1p(KOULE_RUST + np.asarray(vynos, dtype=float) / 100) - np.diag(kovariance) / 2
+    seed = int.from_bytes(hashlib.sha256(repr((tickery, investovano.round(2).tolist(), vynos)).encode()).digest()[:8], "little")
+    rng = np.random.default_rng(seed)
+    hodnoty = np.empty((cest, roky + 1))
+    hodnoty[:, 0] = investovano.sum()
+    # Po dávkách a hned sečtené přes pozice: mezivýsledky mají jen (KOULE_DAVKA, roky, pozice)
+    for od in range(0, cest, KOULE_DAVKA):
+        do = min(cest, od + KOULE_DAVKA)
+        soky = rng.standard_normal((do - od, roky, len(tickery))) @ L.T
+        soky += drift
+        np.cumsum(soky, axis=1, out=soky)
+        np.exp(soky, out=soky)
+        hodnoty[od:do, 1:] = soky @ investovano
+    return list(range(rok_ted, rok_ted + roky + 1)), np.percentile(hodnoty, KOULE_PERCENTILY, axis=0)
+
+def koule_portfolia(portfolio):
+    return snehova_koule(tuple(str(t) for t in portfolio["tickery"]), tuple(portfolio["investovano"].tolist()), tuple(portfolio["vynos"].tolist()))
+
 # --- 3. ROZŠÍŘENÁ DATABÁZE ---
-db_akcii = [
-    # KONZUM
-    {"ticker": "KO", "name": "Coca-Cola", "styl": "Dividenda", "riziko": "Nízké", "sektor": "Konzum", "duvod": "Když je krize, lidi pijí Colu.", "div_yield": 3.1, "div_months": ["Duben", "Červenec", "Říjen", "Prosinec"]},
-    {"ticker": "PEP", "name": "PepsiCo", "styl": "Dividenda", "riziko": "Nízké", "sektor": "Konzum", "duvod": "Vlastní i chipsy Lays.", "div_yield": 3.0, "div_months": ["Leden", "Březen", "Červen", "Září"]},
-    {"ticker": "COST", "name": "Costco", "styl": "Růst", "riziko": "Střední", "sektor": "Konzum", "duvod": "Velkoobchod, který lidé milují.", "div_yield": 0.6, "div_months": ["Únor", "Květen", "Srpen", "Listopad"]},
-    # TECH
-    {"ticker": "AAPL", "name": "Apple", "styl": "Růst", "riziko": "Střední", "sektor": "Tech", "duvod": "Ekosystém, ze kterého se neodchází.", "div_yield": 0.5, "div_months": ["Únor", "Květen", "Srpen", "Listopad"]},
-    {"ticker": "MSFT", "name": "Microsoft", "styl": "Růst", "riziko": "Střední", "sektor": "Tech", "duvod": "Windows a Cloud drží svět.", "div_yield": 0.7, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    {"ticker": "NVDA", "name": "Nvidia", "styl": "Růst", "riziko": "Vysoké", "sektor": "Tech", "duvod": "Mozky pro umělou inteligenci.", "div_yield": 0.0, "div_months": []},
-    {"ticker": "GOOGL", "name": "Google", "styl": "Růst", "riziko": "Střední", "sektor": "Tech", "duvod": "Internet bez něj nefunguje.", "div_yield": 0.0, "div_months": []},
-    {"ticker": "AMZN", "name": "Amazon", "styl": "Růst", "riziko": "Střední", "sektor": "Tech", "duvod": "Král e-shopů a serverů.", "div_yield": 0.0, "div_months": []},
-    # ZDRAVÍ
-    {"ticker": "JNJ", "name": "J&J", "styl": "Dividenda", "riziko": "Nízké", "sektor": "Zdraví", "duvod": "Od náplastí po léky.", "div_yield": 2.9, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    {"ticker": "PFE", "name": "Pfizer", "styl": "Dividenda", "riziko": "Střední", "sektor": "Zdraví", "duvod": "Farmaceutický gigant.", "div_yield": 5.8, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    {"ticker": "LLY", "name": "Eli Lilly", "styl": "Růst", "riziko": "Střední", "sektor": "Zdraví", "duvod": "Léky na hubnutí a cukrovku.", "div_yield": 0.7, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    # ENERGIE & PRŮMYSL
-    {"ticker": "XOM", "name": "Exxon", "styl": "Dividenda", "riziko": "Střední", "sektor": "Energie", "duvod": "Svět stále potřebuje ropu.", "div_yield": 3.4, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    {"ticker": "CVX", "name": "Chevron", "styl": "Dividenda", "riziko": "Střední", "sektor": "Energie", "duvod": "Energetická stálice.", "div_yield": 4.0, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    {"ticker": "CAT", "name": "Caterpillar", "styl": "Dividenda", "riziko": "Střední", "sektor": "Průmysl", "duvod": "Staví svět (bagry).", "div_yield": 1.6, "div_months": ["Únor", "Květen", "Srpen", "Listopad"]},
-    # FINANCE
-    {"ticker": "JPM", "name": "JP Morgan", "styl": "Dividenda", "riziko": "Střední", "sektor": "Finance", "duvod": "Největší banka v USA.", "div_yield": 2.3, "div_months": ["Leden", "Duben", "Červenec", "Říjen"]},
-    {"ticker": "V", "name": "Visa", "styl": "Růst", "riziko": "Nízké", "sektor": "Finance", "duvod": "Každé pípnutí kartou jim vydělá.", "div_yield": 0.8, "div_months": ["Březen", "Červen", "Září", "Prosinec"]},
-    # NEMOVITOSTI
-    {"ticker": "O", "name": "Realty Income", "styl": "Dividenda", "riziko": "Střední", "sektor": "Nemovitosti", "duvod": "Měsíční dividenda z nájmů.", "div_yield": 5.2, "div_months": ["Leden", "Únor", "Březen", "Duben", "Květen", "Červen", "Červenec", "Srpen", "Září", "Říjen", "Listopad", "Prosinec"]},
-]
+# Katalog se čte ze souboru (CSV nebo Parquet) jednou za proces, filtry wizardu jdou přes indexy
+# CSV čteme bez pandas, aby start procesu (a intro) nemusel importovat datový stack
+@st.cache_resource(show_spinner=False)
+def nacti_katalog(cesta=KATALOG_SOUBOR):
+    if cesta.endswith(".parquet"): radky = pd.read_parquet(cesta).fillna("").to_dict("records")
+    else:
+        with open(cesta, newline="", encoding="utf-8") as f: radky = list(csv.DictReader(f))
+    firmy = [
+        {**radek, "div_yield": float(radek['div_yield'] or 0), "div_months": [m for m in str(radek['div_months']).split("|") if m]}
+        for radek in radky
+    ]
+    indexy = {}
+    for sloupec in ("styl", "riziko", "sektor"):
+        skupiny = {}
+        for i, firma in enumerate(firmy): skupiny.setdefault(firma[sloupec], set()).add(i)
+        indexy[sloupec] = {hodnota: frozenset(pozice) for hodnota, pozice in skupiny.items()}
+    return {"firmy": firmy, "indexy": indexy}
+
+def filtruj_katalog(katalog, cil, riziko, sektory):
+    """Filtr wizardu přes průniky množin -> (seřazené indexy firem, True když ve vybraných sektorech nic není)"""
+    indexy = katalog["indexy"]
+    nalezeno = indexy["styl"].get(cil, frozenset())
+    temp = nalezeno & indexy["riziko"].get(riziko, frozenset())
+    if len(temp) >= 2: nalezeno = temp
+    bez_shody = False
+    if sektory:
+        temp = nalezeno & frozenset().union(*(indexy["sektor"].get(x, frozenset()) for x in sektory))
+        if temp: nalezeno = temp
+        else: bez_shody = True
+    return sorted(nalezeno), bez_shody
+
+def stranka_katalogu(katalog, vyber, od, pocet):
+    return [katalog["firmy"][i] for i in vyber[od:od + pocet]]
+
+db_akcii = nacti_katalog()["firmy"]
+
+if ZAHRIVAC_CACHE: spust_zahrivac(tuple(x['ticker'] for x in db_akcii) + (KURZ_TICKER,))
+sleduj_portfolio()
+
+# --- 3b. UKLÁDÁNÍ LEADŮ A PORTFOLIÍ (write-behind fronta) ---
+SLOUPCE_ZAPISU = {
+    "leady": ["cas", "email", "partner", "pocet_firem"],
+    "portfolia": ["cas", "email", "partner", "ticker", "name", "ks", "investice_czk", "buy_price_usd"],
+}
+
+def zapis_do_csv(list_nazev, radky):
+    os.makedirs(ZAPIS_ADRESAR, exist_ok=True)
+    cesta = os.path.join(ZAPIS_ADRESAR, f"{list_nazev}.csv")
+    novy = not os.path.exists(cesta)
+    with open(cesta, "a", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        if novy: w.writerow(SLOUPCE_ZAPISU[list_nazev])
+        w.writerows(radky)
+
+@st.cache_resource(show_spinner=False)
+def sheets_tabulka():
+    import gspread
+    return gspread.service_account(filename=GOOGLE_CREDENTIALS).open_by_key(SHEETS_KLIC)
+
+def zapis_do_sheets(list_nazev, radky):
+    sheets_tabulka().worksheet(list_nazev).append_rows(radky, value_input_option="USER_ENTERED")
+
+ULOZISTE = {"csv": zapis_do_csv, "sheets": zapis_do_sheets}
+
+def zapis_davku(list_nazev, radky, stav):
+    """Zapíše dávku jedním append voláním, s opakováním a exponenciálním backoffem
+    (při ukončení procesu se na další pokus nečeká). Zápisy do CSV jdou pod zámkem stav["zamek"]."""
+    zapis = ULOZISTE[ULOZISTE_ZAPISU]
+    for pokus in range(ZAPIS_POKUSY):
+        try:
+            with stav["zamek"] if zapis is zapis_do_csv else nullcontext():
+                zapis(list_nazev, radky)
+            return
+        except Exception:
+            if stav["konec"].wait(min(60, 2 ** pokus) * random.uniform(0.5, 1.5)): break
+    # Úložiště je nedostupné -> nic neztratíme, řádky skončí v lokálním CSV
+    if zapis is not zapis_do_csv:
+        with stav["zamek"]: zapis_do_csv(list_nazev, radky)
+
+def rozdel_po_listech(davka):
+    po_listech = {}
+    for list_nazev, radek in davka: po_listech.setdefault(list_nazev, []).append(radek)
+    return po_listech
+
+KONEC_ZAPISU = ("konec", None) # Značka ve frontě: zapisovač dopíše, co má, a skončí
+
+def vyber_frontu(fronta, davka, limit=None):
+    """Přidá do dávky čekající řádky (bez čekání); vrátí True, když narazil na KONEC_ZAPISU"""
+    while limit is None or len(davka) < limit:
+        try: polozka = fronta.get_nowait()
+        except queue.Empty: return False
+        if polozka == KONEC_ZAPISU: return True
+        davka.append(polozka)
+    return False
+
+def zapisovac(stav):
+    fronta = stav["fronta"]
+    while True:
+        polozka = fronta.get()
+        konec = polozka == KONEC_ZAPISU
+        davka = [] if konec else [polozka]
+        # Při ukončení procesu (stav["konec"]) se na další řádky nečeká a dávka se zapíše hned
+        stav["konec"].wait(ZAPIS_INTERVAL)
+        konec = vyber_frontu(fronta, davka, ZAPIS_MAX_DAVKA) or konec
+        for list_nazev, radky in rozdel_po_listech(davka).items():
+            try: zapis_davku(list_nazev, radky, stav)
+            except Exception: pass
+        if konec: return
+
+def dopis_frontu(stav):
+    """Při ukončení procesu (redeploy) nechá zapisovač dopsat frontu bez čekání a backoffu. Řádky drží jen on,
+    takže se nic nezapíše dvakrát; když do ZAPIS_KONEC_TIMEOUT nedoběhne (visí v zápisu), zbytek fronty jde do CSV."""
+    stav["konec"].set()
+    stav["fronta"].put(KONEC_ZAPISU)
+    stav["vlakno"].join(ZAPIS_KONEC_TIMEOUT)
+    if not stav["vlakno"].is_alive(): return
+    davka = []
+    vyber_frontu(stav["fronta"], davka)
+    with stav["zamek"]:
+        for list_nazev, radky in rozdel_po_listech(davka).items(): zapis_do_csv(list_nazev, radky)
+
+@st.cache_resource(show_spinner=False)
+def fronta_zapisu():
+    """Jedna fronta a jedno zapisovací vlákno na proces, sdílené všemi sessions"""
+    stav = {"fronta": queue.Queue(), "zamek": threading.Lock(), "konec": threading.Event()}
+    stav["vlakno"] = threading.Thread(target=zapisovac, args=(stav,), name="zapisovac", daemon=True)
+    stav["vlakno"].start()
+    atexit.register(dopis_frontu, stav)
+    return stav["fronta"]
+
+def uloz_lead(email, portfolio):
+    """Zařadí lead a jeho portfolio do fronty; samotný zápis proběhne na pozadí"""
+    cas = datetime.now().isoformat(timespec="seconds")
+    fronta = fronta_zapisu()
+    fronta.put(("leady", [cas, email, active_partner_key, len(portfolio)]))
+    for p in portfolio:
+        fronta.put(("portfolia", [cas, email, active_partner_key, p['ticker'], p['name'], p['ks'], p['investice_czk'], p['buy_price_usd']]))
+
+# --- 3c. PDF REPORT (render na pozadí, cache podle obsahu) ---
+def podklady_reportu(portfolio, faktor):
+    """Vše, co se v PDF objeví, jako čistá data (bez jména uživatele -> stejné plány sdílí jeden report)"""
+    i = index_scenare(faktor)
+    pozice = []
+    for j, ticker in enumerate(portfolio["tickery"]):
+        s = get_position_status_rich(portfolio["ceny_scenare"][j, i], portfolio["prumerna_nakupka_usd"][j], portfolio["kurz"])
+        pozice.append({
+            "name": portfolio["nazvy"][j], "ticker": str(ticker), "ks": round(float(portfolio["ks"][j]), 4),
+            "investovano": round(float(portfolio["investovano"][j])), "hodnota": round(float(portfolio["hodnota_scenare"][j, i])),
+            "status": s["title"], "popis": s["subtitle"],
+        })
+    total_invested = float(portfolio["investovano"].sum())
+    roky, pasma = koule_portfolia(portfolio)
+    return {
+        "faktor": float(SCENARE_NALADY[i]),
+        "investovano": round(total_invested),
+        "hodnota": round(float(portfolio["hodnota_scenare"][:, i].sum())),
+        "divi_rocne": round(float(portfolio["divi_rocne"].sum())),
+        "pozice": pozice,
+        "kalendar": [round(float(x)) for x in portfolio["kalendar"]],
+        "snehova_koule": [[r] + [round(float(h)) for h in hodnoty] for r, hodnoty in zip(roky, pasma.T)],
+    }
+
+@st.cache_resource(show_spinner=False)
+def pdf_fonty():
+    """fpdf 1.7 si při prvním add_font(uni=True) zapisuje metriky fontu (.pkl) vedle systémového TTF;
+    přesměrujeme je do soukromého adresáře procesu a první render necháme doběhnout samotný"""
+    modul = importlib.import_module("fpdf.fpdf")
+    adresar = tempfile.mkdtemp(prefix="pruvodce-fpdf-")
+    atexit.register(shutil.rmtree, adresar, True)
+    modul.FPDF_CACHE_MODE, modul.FPDF_CACHE_DIR = 2, adresar
+    return {"zamek": threading.Lock(), "hotovo": False}
+
+def vykresli_pdf(podklady):
+    fonty = pdf_fonty()
+    # Jinak by druhé vlákno z poolu mohlo číst napůl zapsaný .pkl
+    with nullcontext() if fonty["hotovo"] else fonty["zamek"]:
+        vystup = sestav_pdf(podklady)
+        fonty["hotovo"] = True
+    return vystup
+
+def sestav_pdf(podklady):
+    from fpdf import FPDF
+    pdf = FPDF()
+    unicode = os.path.exists(PDF_FONT)
+    if unicode:
+        pdf.add_font("Report", "", PDF_FONT, uni=True)
+        font = "Report"
+    else:
+        font = "Arial"
+
+    def text(t):
+        # Emoji a znaky mimo BMP fpdf neumí; bez TTF fontu jen latin-1 bez diakritiky
+        t = "".join(c for c in str(t) if ord(c) <= 0xFFFF)
+        if unicode: return t
+        return unicodedata.normalize("NFKD", t).encode("latin-1", "ignore").decode("latin-1")
+
+    pdf.add_page()
+    pdf.set_font(font, "", 18)
+    pdf.cell(0, 12, text("Tvoje portfolio"), ln=1)
+    pdf.set_font(font, "", 10)
+    pdf.cell(0, 6, text(f"Investováno: {podklady['investovano']:,} Kč   Hodnota: {podklady['hodnota']:,} Kč   Pasivní příjem: {podklady['divi_rocne']:,} Kč/rok"), ln=1)
+    if podklady["faktor"] != 1.0: pdf.cell(0, 6, text(f"Simulace nálady trhu: {podklady['faktor']:.1f}x"), ln=1)
+
+    pdf.ln(4)
+    pdf.set_font(font, "", 13)
+    pdf.cell(0, 8, text("Pozice"), ln=1)
+    pdf.set_font(font, "", 9)
+    for nazev, sirka in [("Firma", 60), ("Ks", 25), ("Investováno", 35), ("Hodnota", 35)]: pdf.cell(sirka, 6, text(nazev), border=1)
+    pdf.ln()
+    for p in podklady["pozice"]:
+        pdf.cell(60, 6, text(f"{p['name']} ({p['ticker']})"), border=1)
+        pdf.cell(25, 6, text(f"{p['ks']:.4f}"), border=1)
+        pdf.cell(35, 6, text(f"{p['investovano']:,} Kč"), border=1)
+        pdf.cell(35, 6, text(f"{p['hodnota']:,} Kč"), border=1)
+        pdf.ln()
+        pdf.cell(0, 6, text(f"   {p['status']}: {p['popis']}"), ln=1)
+
+    if podklady["divi_rocne"] > 0:
+        pdf.ln(4)
+        pdf.set_font(font, "", 13)
+        pdf.cell(0, 8, text("Výplatní kalendář"), ln=1)
+        pdf.set_font(font, "", 9)
+        for mesic, castka in zip(MESICE, podklady["kalendar"]): pdf.cell(0, 5, text(f"{mesic}: {castka:,} Kč"), ln=1)
+
+    pdf.ln(4)
+    pdf.set_font(font, "", 13)
+    cest_text = f"{KOULE_CEST:,}".replace(",", " ")
+    pdf.cell(0, 8, text(f"Sněhová koule (simulace {cest_text} vývojů trhu)"), ln=1)
+    pdf.set_font(font, "", 9)
+    for rok, dolni, stred, horni in podklady["snehova_koule"][::5] + podklady["snehova_koule"][-1:]:
+        pdf.cell(0, 5, text(f"{rok}: {stred:,} Kč (pesimisticky {dolni:,} Kč, optimisticky {horni:,} Kč)"), ln=1)
+
+    vystup = pdf.output(dest="S")
+    return vystup.encode("latin-1") if isinstance(vystup, str) else bytes(vystup)
+
+@st.cache_resource(show_spinner=False)
+def pdf_reporty():
+    """Sdílené v procesu: hash podkladů -> Future s hotovým (nebo rozpracovaným) PDF"""
+    return {"zamek": threading.Lock(), "reporty": OrderedDict(), "pool": ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf")}
+
+def pdf_report(podklady):
+    klic = hashlib.sha256(json.dumps(podklady, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    r = pdf_reporty()
+    with r["zamek"]:
+        future = r["reporty"].get(klic)
+        if future is None or (future.done() and future.exception()):
+            future = r["pool"].submit(vykresli_pdf, podklady)
+            r["reporty"][klic] = future
+            while len(r["reporty"]) > PDF_CACHE_MAX: r["reporty"].popitem(last=False)
+        r["reporty"].move_to_end(klic)
+    return future
 
 # --- 4. MODÁL NÁKUPU ---
-@st.dialog("Nastavení investice")
-def nakupni_okno(firma, cena_usd):
+def potvrd_nakup(firma, pocet_akcii, investice_czk, cena_usd):
+    st.session_state.moje_portfolio.append({
+        "ticker": firma['ticker'], 
+        "name": firma['name'], 
+        "ks": pocet_akcii, 
+        "investice_czk": investice_czk,
+        "buy_price_usd": cena_usd, 
+        "yield": firma.get('div_yield', 0),
+        "months": firma.get('div_months', [])
+    })
+    sleduj_portfolio() # potvrzení běží jen ve fragmentu okna, celý skript (a jeho obnova) se nespustí
+    st.session_state.nakup_potvrzen = firma['ticker']
+
+def po_zavreni_nakupu():
+    # Zavření okna překreslí jen souhrn portfolia, ne celou stránku s kartami
+    st.session_state.nakup_potvrzen = None
+    st.rerun("souhrn_portfolia")
+
+@st.dialog("Nastavení investice", on_dismiss=po_zavreni_nakupu)
+@merene_fragment
+def nakupni_okno(firma, nasobek, posun):
+    # Cena se počítá až tady: fragment karty drží argumenty z posledního celého běhu, ne aktuální náladu trhu
+    cena_usd = cena_pri_nalade(nasobek, posun)
+    kurz = aktualni_kurz(kurzy_usd_czk())
     st.subheader(f"Kupuješ: {firma['name']}")
     col_img, col_info = st.columns([1, 3])
-    with col_img: st.image(f"https://financialmodelingprep.com/image-stock/{firma['ticker']}.png", width=50)
-    with col_info: st.metric("Aktuální cena", f"{cena_usd:.2f} USD", f"{int(cena_usd * KURZ_USD_CZK)} Kč")
+    with col_img: img(obrazek_akcie(firma['ticker']), 50)
+    with col_info: st.metric("Aktuální cena", f"{cena_usd:.2f} USD", f"{int(cena_usd * kurz)} Kč")
+
+    if st.session_state.get('nakup_potvrzen') == firma['ticker']:
+        st.toast(f"{firma['name']} přidána do portfolia!", icon="🎒")
+        st.success(f"✅ {firma['name']} je v portfoliu. Okno můžeš zavřít.")
+        return
     
     st.markdown("---")
     typ_nakupu = st.radio("Jak chceš nakoupit?", ["Chci investovat částku (Kč)", "Chci konkrétní počet kusů (ks)"])
     if "částku" in typ_nakupu:
         investice_czk = st.number_input("Kolik chceš investovat (Kč)?", min_value=100, value=1000, step=100)
-        investice_usd = investice_czk / KURZ_USD_CZK
+        investice_usd = investice_czk / kurz
         pocet_akcii = investice_usd / cena_usd
         st.info(f"💡 Za **{investice_czk} Kč** dostaneš **{pocet_akcii:.4f} ks** akcie.")
     else:
         pocet_akcii = st.number_input("Kolik akcií?", min_value=0.1, value=1.0, step=0.1)
-        investice_czk = pocet_akcii * cena_usd * KURZ_USD_CZK
+        investice_czk = pocet_akcii * cena_usd * kurz
         st.info(f"💡 **{pocet_akcii} ks** tě bude stát cca **{int(investice_czk)} Kč**.")
     
     st.warning("ℹ️ **Spread (Poplatek):** Cca 0.5 %. To je normální, nelekni se malého mínusu po nákupu.")
     
-    if st.button("✅ Potvrdit", type="primary"):
-        st.session_state.moje_portfolio.append({
-            "ticker": firma['ticker'], 
-            "name": firma['name'], 
-            "ks": pocet_akcii, 
-            "investice_czk": investice_czk,
-            "buy_price_usd": cena_usd, 
-            "yield": firma.get('div_yield', 0),
-            "months": firma.get('div_months', [])
-        })
-        st.toast(f"{firma['name']} přidána do portfolia!", icon="🎒")
-        time.sleep(1)
-        st.rerun()
+    st.button("✅ Potvrdit", type="primary", on_click=potvrd_nakup, args=(firma, pocet_akcii, investice_czk, cena_usd))
+
+# Karty výsledků: každá karta je vlastní fragment, "Koupit" nepřekresluje zbytek stránky
+@st.fragment
+@merene_fragment
+def karta_firmy(firma, nasobek, posun, graf_data, kurzy):
+    with st.container():
+        st.markdown(f'<div class="card-highlight">', unsafe_allow_html=True)
+        c1, c2, c3 = st.columns([1, 3, 2])
+        with c1: img(obrazek_akcie(firma['ticker']), 60)
+        with c2:
+            st.markdown(f"### {firma['name']}")
+            st.caption(f"{firma['sektor']} • {firma['duvod']}")
+        with c3:
+            if st.button(f"🛒 Koupit", key=f"btn_{firma['ticker']}", type="secondary", use_container_width=True):
+                nakupni_okno(firma, nasobek, posun)
+        
+        with mereni("pruvodce_funkce_seconds", funkce="graf_karty"):
+            st.area_chart(graf_karty(firma['ticker'], graf_data, kurzy), height=80, color=current_partner['color_primary'])
+        st.markdown('</div>', unsafe_allow_html=True)
+
+def nacti_dalsi_karty():
+    st.session_state.karet_zobrazeno = st.session_state.get('karet_zobrazeno', KARET_NA_STRANKU) + KARET_NA_STRANKU
+
+@st.fragment
+@merene_fragment
+def seznam_karet(nalezeno):
+    """Vykreslí jen první stránky karet (nalezeno = indexy do katalogu), ceny se načítají jen pro ty viditelné"""
+    zobrazeno = st.session_state.get('karet_zobrazeno', KARET_NA_STRANKU)
+    viditelne = stranka_katalogu(nacti_katalog(), nalezeno, 0, zobrazeno)
+    data_karet, kurzy = nacti_data_hromadne([(x['ticker'], x['styl']) for x in viditelne])
+    for firma in viditelne:
+        nasobek, posun, mena, graf_data = data_karet[firma['ticker']]
+        karta_firmy(firma, nasobek, posun, graf_data, kurzy)
+
+    if zobrazeno < len(nalezeno):
+        st.button(f"⬇️ Načíst další ({len(nalezeno) - zobrazeno})", use_container_width=True, on_click=nacti_dalsi_karty)
+
+@st.fragment(key="souhrn_portfolia")
+@merene_fragment
+def souhrn_portfolia():
+    if st.session_state.moje_portfolio:
+        st.success(f"Máš vybráno {len(st.session_state.moje_portfolio)} firem.")
+        
+        # Lead Capture (PDF Unlock)
+        if not st.session_state.lead_captured:
+            st.markdown("### 🔒 Odemknout analýzu a uložit")
+            col_mail, col_btn = st.columns([3, 1])
+            with col_mail: email = st.text_input("Tvůj email (pošleme ti tam PDF):", placeholder="petr@email.cz")
+            with col_btn: 
+                st.write("")
+                st.write("")
+                if st.button("Odemknout", type="primary"):
+                    if "@" in email:
+                        uloz_lead(email, st.session_state.moje_portfolio)
+                        st.session_state.lead_captured = True
+                        st.session_state.user_name = email.split("@")[0]
+                        st.session_state.page = "dashboard"
+                        st.rerun()
+        else:
+             if st.button("🚀 Přejít na Dashboard", type="primary", use_container_width=True):
+                 st.session_state.page = "dashboard"
+                 st.rerun()
 
 # --- 5. UI FLOW ---
 
-with st.sidebar:
+def vykresli_scenar(panely, faktor):
+    """Překreslí jen části dashboardu, které závisí na náladě trhu (bez nového načítání cen)"""
+    portfolio = panely["portfolio"]
+    panely["faktor"] = faktor
+    i = index_scenare(faktor)
+    hodnoty = portfolio["hodnota_scenare"][:, i]
+    total_val = hodnoty.sum()
+    diff = total_val - portfolio["investovano"].sum()
+    panely["hodnota"].metric("Hodnota", f"{int(total_val)} Kč", delta=f"{int(diff)} Kč", delta_color="normal" if diff>=0 else "off")
+
+    for j, (hodnota_panel, karta_panel) in enumerate(panely["pozice"]):
+        s = get_position_status_rich(portfolio["ceny_scenare"][j, i], portfolio["prumerna_nakupka_usd"][j], portfolio["kurz"])
+        hodnota_panel.markdown(f"*{int(hodnoty[j])} Kč*")
+        karta_panel.markdown(f"""
+        <div class="panic-card {s['class']}">
+            <div style="font-size: 24px;">{s['icon']} {s['title']}</div>
+            <div style="font-weight: bold; font-size: 18px; margin: 5px 0;">{s['subtitle']}</div>
+            <div style="opacity: 0.9;">{s['desc']}</div>
+        </div>
+        """, unsafe_allow_html=True)
+
+# Pohyb slideru přepočítá jen tento fragment, ne celou stránku
+@st.fragment
+@merene_fragment
+def god_mode(panely):
     st.header(f"⚙️ God Mode")
     market_sentiment = st.slider("Nálada trhu", 0.5, 1.5, 1.0, 0.1)
     st.session_state.market_factor = market_sentiment
     if market_sentiment < 1.0: st.info(f"📉 Simulace: Pokles o {int((1-market_sentiment)*100)} %")
+    if panely: vykresli_scenar(panely, market_sentiment)
+    if st.toggle("🐞 Debug panel", key="debug_panel"): vykresli_debug_panel()
+
+def vykresli_debug_panel():
+    st.caption("Tato session (poslední běhy):")
+    st.dataframe(pd.DataFrame(st.session_state.get('casy_stranek', []), columns=["Stránka", "ms"]), hide_index=True)
+    st.caption("Celý proces:")
+    m = metriky()
+    with m["zamek"]:
+        popis = lambda s: s.get("funkce") or s.get("stranka") or (f"{s['fragment']} (fragment)" if "fragment" in s else f"import {s.get('modul')}")
+        casy = [(popis(dict(stitky)), h["pocet"], 1000 * h["soucet"] / h["pocet"]) for (_, stitky), h in m["histogramy"].items()]
+        citace = [(nazev.replace("pruvodce_", "") + " " + ",".join(f"{v}" for _, v in stitky), hodnota) for (nazev, stitky), hodnota in m["citace"].items()]
+    st.dataframe(pd.DataFrame(casy, columns=["Měření", "Počet", "Průměr ms"]).sort_values("Průměr ms", ascending=False), hide_index=True)
+    st.dataframe(pd.DataFrame(citace, columns=["Čítač", "Hodnota"]), hide_index=True)
+
+panely_scenare = None
+stranka = st.session_state.page
+zacatek_stranky = time.perf_counter()
 
 if st.session_state.page == "intro":
     c1, c2 = st.columns([2, 1])
     with c1:
         # LOGIKA PRO LOGO Z DISKU (S BÍLÝM POZADÍM)
-        logo_b64 = None
-        if current_partner['logo_file']:
-            logo_b64 = get_img_as_base64(current_partner['logo_file'])
+        logo_url = logo_partnera(current_partner['logo_file'])
             
-        if logo_b64:
+        if logo_url:
             # HTML trik: Bílý kontejner pro logo, aby bylo vidět i černé na tmavém
             # Změna: width z 200 na 100
             st.markdown(
                 f'<div style="background-color: white; padding: 15px; border-radius: 10px; display: inline-block; margin-bottom: 20px;">'
-                f'<img src="data:image/png;base64,{logo_b64}" width="100">' 
+                f'<img src="{logo_url}" width="100">' 
                 f'</div>', 
                 unsafe_allow_html=True
             )
@@ -259,7 +1270,7 @@ if st.session_state.page == "intro":
         st.caption("ℹ️ Zabere to cca 2 minuty. Na konci dostaneš seznam firem na míru.")
         
     with c2:
-        st.image("https://cdn-icons-png.flaticon.com/512/3135/3135715.png", width=200)
+        img("https://cdn-icons-png.flaticon.com/512/3135/3135715.png", 200)
 
 elif st.session_state.page == "education":
     st.title("🎓 Rychlokurz investora")
@@ -351,6 +1362,7 @@ elif st.session_state.page == "wizard_3":
     
     if st.button("🎉 Ukázat moje portfolio", type="primary"):
         st.session_state.temp_sektory = vyber
+        st.session_state.karet_zobrazeno = KARET_NA_STRANKU
         st.session_state.page = "results"
         st.rerun()
 
@@ -360,92 +1372,26 @@ elif st.session_state.page == "results":
     riziko = st.session_state.temp_riziko
     sektory = st.session_state.temp_sektory
     
-    nalezeno = [x for x in db_akcii if x['styl'] == cil]
-    temp = [x for x in nalezeno if x['riziko'] == riziko]
-    if len(temp) >= 2: nalezeno = temp
-    if sektory:
-        temp = [x for x in nalezeno if x['sektor'] in sektory]
-        if temp: nalezeno = temp
-        else: st.warning(f"V sektorech {', '.join(sektory)} jsme nenašli shodu. Zde jsou alternativy.")
+    nalezeno, bez_shody = filtruj_katalog(nacti_katalog(), cil, riziko, sektory)
+    if bez_shody: st.warning(f"V sektorech {', '.join(sektory)} jsme nenašli shodu. Zde jsou alternativy.")
 
     st.subheader(f"Tvůj plán na míru ({len(nalezeno)} firem)")
-    
-    for firma in nalezeno:
-        cena_usd, mena, graf_data = ziskej_data_smart(firma['ticker'], firma['styl'])
-        
-        with st.container():
-            st.markdown(f'<div class="card-highlight">', unsafe_allow_html=True)
-            c1, c2, c3 = st.columns([1, 3, 2])
-            with c1: st.image(f"https://financialmodelingprep.com/image-stock/{firma['ticker']}.png", width=60)
-            with c2:
-                st.markdown(f"### {firma['name']}")
-                st.caption(f"{firma['sektor']} • {firma['duvod']}")
-            with c3:
-                if st.button(f"🛒 Koupit", key=f"btn_{firma['ticker']}", type="secondary", use_container_width=True):
-                    nakupni_okno(firma, cena_usd)
-            
-            st.area_chart(graf_data, height=80, color=current_partner['color_primary'])
-            st.markdown('</div>', unsafe_allow_html=True)
-
-    if st.session_state.moje_portfolio:
-        st.success(f"Máš vybráno {len(st.session_state.moje_portfolio)} firem.")
-        
-        # Lead Capture (PDF Unlock)
-        if not st.session_state.lead_captured:
-            st.markdown("### 🔒 Odemknout analýzu a uložit")
-            col_mail, col_btn = st.columns([3, 1])
-            with col_mail: email = st.text_input("Tvůj email (pošleme ti tam PDF):", placeholder="petr@email.cz")
-            with col_btn: 
-                st.write("")
-                st.write("")
-                if st.button("Odemknout", type="primary"):
-                    if "@" in email:
-                        st.session_state.lead_captured = True
-                        st.session_state.user_name = email.split("@")[0]
-                        st.session_state.page = "dashboard"
-                        st.rerun()
-        else:
-             if st.button("🚀 Přejít na Dashboard", type="primary", use_container_width=True):
-                 st.session_state.page = "dashboard"
-                 st.rerun()
+    seznam_karet(nalezeno)
+    souhrn_portfolia()
 
 elif st.session_state.page == "dashboard":
     st.balloons()
     st.title(f"Portfolio: {st.session_state.user_name}")
     
-    portfolio_display = []
-    total_val = 0
-    total_invested = 0
-    rocni_divi = 0
-    
-    # DATA PRO KALENDÁŘ
-    kalendar_prijmu = {"Leden": 0, "Únor": 0, "Březen": 0, "Duben": 0, "Květen": 0, "Červen": 0, "Červenec": 0, "Srpen": 0, "Září": 0, "Říjen": 0, "Listopad": 0, "Prosinec": 0}
-    
-    for p in st.session_state.moje_portfolio:
-        curr, _, _ = ziskej_data_smart(p['ticker'], "Neznámý")
-        val = p['ks'] * curr * KURZ_USD_CZK
-        total_val += val
-        total_invested += p['investice_czk']
-        
-        # Výpočet dividend
-        if p.get('yield'):
-             annual_income = p['investice_czk'] * (p['yield']/100)
-             rocni_divi += annual_income
-             # Rozpočítání do měsíců
-             if p.get('months'):
-                 castka_per_mesic = annual_income / len(p['months'])
-                 for m in p['months']:
-                     if m in kalendar_prijmu:
-                         kalendar_prijmu[m] += castka_per_mesic
-
-        status = get_position_status_rich(curr, p['buy_price_usd'])
-        portfolio_display.append({"name": p['name'], "ticker": p['ticker'], "status": status, "val": val})
+    portfolio = ocen_portfolio(st.session_state.moje_portfolio)
+    total_invested = portfolio["investovano"].sum()
+    rocni_divi = portfolio["divi_rocne"].sum()
 
     # KPI
     k1, k2, k3 = st.columns(3)
     k1.metric("Investováno", f"{int(total_invested)} Kč")
-    diff = total_val - total_invested
-    k2.metric("Hodnota", f"{int(total_val)} Kč", delta=f"{int(diff)} Kč", delta_color="normal" if diff>=0 else "off")
+    # Hodnotu a karty vykresluje až god_mode, aby je slider mohl měnit bez reruna
+    panely_scenare = {"portfolio": portfolio, "faktor": st.session_state.get('market_factor', 1.0), "hodnota": k2.empty(), "pozice": []}
     k3.metric("Pasivní příjem (ročně)", f"{int(rocni_divi):,} Kč", "Budoucí renta")
 
     # NOVÁ SEKCE: VÝPLATNÍ KALENDÁŘ
@@ -455,8 +1401,9 @@ elif st.session_state.page == "dashboard":
         st.caption("Kdy ti cinknou peníze na účtu? (Odhad na základě minulého roku)")
         
         # Vytvoření grafu
-        df_cal = pd.DataFrame(list(kalendar_prijmu.items()), columns=["Měsíc", "Příjem (Kč)"])
-        st.bar_chart(df_cal.set_index("Měsíc"), color=current_partner['color_primary'])
+        df_cal = pd.DataFrame({"Měsíc": MESICE, "Příjem (Kč)": portfolio["kalendar"]})
+        with mereni("pruvodce_funkce_seconds", funkce="graf_kalendar"):
+            st.bar_chart(df_cal.set_index("Měsíc"), color=current_partner['color_primary'])
         
         # Malá gratulace, pokud je to hodně
         if rocni_divi > 1200:
@@ -465,28 +1412,49 @@ elif st.session_state.page == "dashboard":
     st.markdown("---")
     st.subheader("📦 Tvoje Portfolio")
     
-    for item in portfolio_display:
-        s = item['status']
+    for i, ticker in enumerate(portfolio["tickery"]):
         c1, c2 = st.columns([2,1])
-        c1.markdown(f"**{item['name']}** ({item['ticker']})")
-        c2.markdown(f"*{int(item['val'])} Kč*")
-        
-        st.markdown(f"""
-        <div class="panic-card {s['class']}">
-            <div style="font-size: 24px;">{s['icon']} {s['title']}</div>
-            <div style="font-weight: bold; font-size: 18px; margin: 5px 0;">{s['subtitle']}</div>
-            <div style="opacity: 0.9;">{s['desc']}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        c1.markdown(f"**{portfolio['nazvy'][i]}** ({ticker})")
+        panely_scenare["pozice"].append((c2.empty(), st.empty()))
+
+    historie, bez_historie = historie_portfolia(portfolio)
+    if historie is not None and len(historie) > 1:
+        st.subheader("📈 Tvoje pozice za poslední rok")
+        st.caption("Kolik by dnešní pozice měly v Kč podle skutečných cen a kurzu daného dne.")
+        with mereni("pruvodce_funkce_seconds", funkce="graf_historie_portfolia"):
+            st.line_chart(historie.iloc[zmensi_serii(historie, GRAF_BODU_HISTORIE)], color=current_partner['color_primary'])
+        if bez_historie: st.caption(f"Bez historie cen (jen simulace): {', '.join(bez_historie)}")
 
     st.subheader("❄️ Efekt Sněhové koule (20 let)")
-    roky = list(range(2025, 2045))
-    hodnoty = [total_invested * (1.08 ** i) for i in range(len(roky))]
-    st.area_chart(pd.DataFrame({"Rok": roky, "Hodnota": hodnoty}).set_index("Rok"), color=current_partner['color_primary'])
+    cest_text = f"{KOULE_CEST:,}".replace(",", " ")
+    st.caption(f"Simulace {cest_text} možných vývojů trhu podle kolísání tvých firem, dividendy se reinvestují.")
+    roky, pasma = koule_portfolia(portfolio)
+    df_koule = pd.DataFrame(pasma.T, index=pd.Index(roky, name="Rok"), columns=["Pesimisticky (10 %)", "Střed (50 %)", "Optimisticky (90 %)"])
+    with mereni("pruvodce_funkce_seconds", funkce="graf_snehova_koule"):
+        barva = current_partner['color_primary']
+        st.area_chart(df_koule, stack=False, color=[barva + "40", barva + "99", barva + "40"])
+
+    # PDF se začne renderovat na pozadí hned; tlačítko si ho vyzvedne (pro aktuální náladu trhu) až po kliknutí
+    pdf_report(podklady_reportu(portfolio, panely_scenare["faktor"]))
+    st.download_button(
+        "📄 Stáhnout PDF report",
+        data=lambda: pdf_report(podklady_reportu(portfolio, panely_scenare["faktor"])).result(),
+        file_name="portfolio.pdf", mime="application/pdf", on_click="ignore", use_container_width=True
+    )
 
     st.link_button(current_partner['cta_text'], current_partner['cta_link'], type="primary", use_container_width=True)
     if st.button("🔄 Reset", type="secondary"):
         st.session_state.moje_portfolio = []
+        sleduj_portfolio()
+        st.session_state.pop('historie_portfolia', None)
         st.session_state.page = "intro"
         st.rerun()
 
+with st.sidebar:
+    god_mode(panely_scenare)
+
+# Časy stránek včetně sidebaru (běhy ukončené přes st.rerun() jsou jen přechody a neměří se)
+doba_stranky = time.perf_counter() - zacatek_stranky
+zaznamenej_cas("pruvodce_stranka_seconds", doba_stranky, stranka=stranka)
+st.session_state.casy_stranek = (st.session_state.get('casy_stranek', []) + [(stranka, round(1000 * doba_stranky, 1))])[-20:]
+exportuj_metriky()
@@ -0,0 +1,229 @@
+"""Headless benchmark celého průchodu aplikací (intro -> wizard -> results -> dashboard).
+
+Spouští N souběžně otevřených sessions přes Streamlit AppTest, yfinance nahrazuje
+daty bez sítě: z benchmark/fixtures/<TICKER>.csv, pokud existuje, jinak z generátoru níže. AppTest neumí běžet
+ve více vláknech naráz, takže sessions jednoho procesu se střídají krok po kroku
+(sdílí cache procesu) a více workerů simuluje --procesy (sdílí SQLite sklad).
+Na konci vypíše p50/p95 doby běhů podle stránky, paměť na session a chování cache.
+
+AppTest při každé interakci spouští celý skript, takže kroky Koupit a Potvrdit
+se měří jako plné běhy stránky; reruny jen fragmentu (karty, souhrn portfolia,
+slider God Mode) tenhle benchmark neměří.
+
+    python benchmark/bench.py --sessions 8 --procesy 2 --kola 3
+    python benchmark/bench.py --ulozit baseline.json
+    python benchmark/bench.py --baseline baseline.json   # porovnání se základem
+    python benchmark/bench.py --nahrat                   # nahraje fixtures z Yahoo (potřebuje síť)
+
+V repu žádné fixtures nejsou: zdrojem dat je deterministický generátor (náhodná
+procházka kolem 100 USD, kurzy měn kolem 23), takže výsledky neodráží tvar skutečných
+cen (splity, mezery, svátky). Skutečná data nahraje --nahrat; tickery bez souboru
+dál jdou přes generátor. Data se posunou tak, aby poslední den byl dnešek (sklad maže
+ceny starší než rok).
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+KOREN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(KOREN, "app.py")
+FIXTURES = os.path.join(KOREN, "benchmark", "fixtures")
+KATALOG = os.path.join(KOREN, "data", "akcie.csv")
+PARTNERI = ["default", "xtb", "t212", "etoro"]
+
+# --- Falešné yfinance ---
+VOLANI_YAHOO = Counter()
+_zamek = threading.Lock()
+_fixtures = {}
+
+def nacti_fixture(ticker):
+    with _zamek:
+        if ticker not in _fixtures:
+            cesta = os.path.join(FIXTURES, f"{ticker}.csv")
+            if os.path.exists(cesta):
+                hist = pd.read_csv(cesta, index_col="Date")
+                hist.index = pd.to_datetime(hist.index, utc=True)
+            else:
+                dny = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=252, tz="UTC")
+                rng = np.random.default_rng(sum(ord(c) for c in ticker))
+                zaklad = 23 if ticker.endswith("=X") else 100  # kurzy měn (CZK=X) kolem skutečné úrovně
+                hist = pd.DataFrame({"Close": zaklad * np.exp(np.cumsum(rng.normal(0, 0.015, len(dny))))}, index=dny)
+            hist.index = hist.index + (pd.Timestamp.today(tz="UTC").normalize() - hist.index[-1].normalize())
+            hist.index.name = "Date"
+            _fixtures[ticker] = hist
+        return _fixtures[ticker]
+
+def falesne_yfinance(latence):
+    class Ticker:
+        def __init__(self, ticker):
+            self.ticker = ticker
+
+        def history(self, period=None, start=None, timeout=None, **kwargs):
+            with _zamek: VOLANI_YAHOO[self.ticker] += 1
+            time.sleep(latence)
+            hist = nacti_fixture(self.ticker)
+            if start is not None: hist = hist[hist.index >= pd.Timestamp(start, tz="UTC")]
+            return hist.copy()
+
+    modul = types.ModuleType("yfinance")
+    modul.Ticker = Ticker
+    return modul
+
+def nahraj_fixtures():
+    import yfinance as yf
+    os.makedirs(FIXTURES, exist_ok=True)
+    for ticker in list(pd.read_csv(KATALOG)["ticker"]) + ["CZK=X"]:  # + kurz USD/CZK
+        hist = yf.Ticker(ticker).history(period="1y")
+        hist.index = hist.index.strftime("%Y-%m-%d")
+        hist[["Close"]].round(4).to_csv(os.path.join(FIXTURES, f"{ticker}.csv"))
+        print(f"{ticker}: {len(hist)} dní")
+
+# --- Jedna session ---
+def klikni(at, text):
+    for b in at.button:
+        if text in b.label:
+            b.click()
+            return
+    raise RuntimeError(f"Tlačítko '{text}' na stránce {at.session_state.page} chybí")
+
+def pruchod(i, casy):
+    """Generátor: jeden krok průchodu (= jeden rerun) na každé next()"""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.query_params["partner"] = PARTNERI[i % len(PARTNERI)]
+    kroky = [
+        None,
+        lambda: klikni(at, "Sestavit můj plán"),
+        lambda: (at.radio[0].set_value(at.radio[0].options[i % 2]), klikni(at, "Dále")),
+        lambda: (at.radio[0].set_value(at.radio[0].options[i % 3]), klikni(at, "Dále")),
+        lambda: (at.multiselect[0].set_value(at.multiselect[0].options[i % 3:i % 3 + i % 2 + 1]), klikni(at, "Ukázat moje portfolio")),
+        lambda: at.button(key=next(b.key for b in at.button if b.key and b.key.startswith("btn_"))).click(),
+        lambda: klikni(at, "Potvrdit"),
+        lambda: (at.text_input[0].input(f"bench{i}@example.com"), klikni(at, "Odemknout")),
+        None,  # znovuvykreslení dashboardu (teplá cache)
+    ]
+    for akce in kroky:
+        stranka = at.session_state.page if "page" in at.session_state else "intro"
+        if akce: akce()
+        zacatek = time.perf_counter()
+        at.run()
+        casy[stranka].append(time.perf_counter() - zacatek)
+        if at.exception: raise RuntimeError(f"{stranka}: {at.exception[0].message}")
+        yield at
+
+def worker(zadani):
+    """Jeden proces = jeden Streamlit worker; jeho sessions se střídají po krocích"""
+    cisla, latence = zadani
+    hlavni = sys.modules["__main__"]  # AppTest ho přepíše na app.py a další zadání by pak nešlo rozbalit
+    try:
+        return _worker(cisla, latence)
+    finally:
+        sys.modules["__main__"] = hlavni
+
+def _worker(cisla, latence):
+    sys.modules["yfinance"] = falesne_yfinance(latence)
+    from streamlit.testing.v1 import AppTest
+    AppTest.from_file(APP, default_timeout=120).run()  # zahřátí importů, do paměti na session se nepočítá
+    casy = defaultdict(list)
+    volani_pred = sum(VOLANI_YAHOO.values())
+    rss_pred = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    bezici = [pruchod(i, casy) for i in cisla]
+    zive = []
+    while bezici:
+        for g in list(bezici):
+            try: zive.append(next(g))
+            except StopIteration: bezici.remove(g)
+    rss_po = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    kb = 1 if sys.platform != "darwin" else 1024  # ru_maxrss je na Linuxu v KB, na macOS v bajtech
+    return dict(casy), (rss_po - rss_pred) / kb / max(1, len(cisla)), sum(VOLANI_YAHOO.values()) - volani_pred
+
+def percentil(hodnoty, p):
+    return 1000 * float(np.percentile(hodnoty, p)) if hodnoty else float("nan")
+
+def citace_cache(adresar):
+    citace = Counter()
+    for soubor in os.listdir(adresar) if os.path.isdir(adresar) else []:
+        for radek in open(os.path.join(adresar, soubor)):
+            if radek.startswith(("pruvodce_cache_total", "pruvodce_fallback_total")):
+                nazev, hodnota = radek.rsplit(" ", 1)
+                citace[nazev] += float(hodnota)
+    return citace
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=8, help="souběžné sessions v jednom kole")
+    parser.add_argument("--procesy", type=int, default=2, help="počet worker procesů (sdílí jen SQLite sklad)")
+    parser.add_argument("--kola", type=int, default=3, help="počet kol (první je se studenou cache)")
+    parser.add_argument("--latence", type=float, default=0.15, help="simulovaná latence Yahoo v sekundách")
+    parser.add_argument("--ulozit", help="uloží výsledek jako JSON (nový baseline)")
+    parser.add_argument("--baseline", help="JSON z dřívějšího běhu pro porovnání")
+    parser.add_argument("--nahrat", action="store_true", help="nahraje fixtures z Yahoo a skončí")
+    args = parser.parse_args()
+
+    if args.nahrat:
+        nahraj_fixtures()
+        return
+
+    docasny = tempfile.mkdtemp(prefix="pruvodce-bench-")
+    os.environ.update({
+        "HISTORIE_DB": os.path.join(docasny, "historie.sqlite"),
+        "ZAPIS_ADRESAR": os.path.join(docasny, "zapis"),
+        "METRIKY_ADRESAR": os.path.join(docasny, "metriky"),
+        "METRIKY_INTERVAL": "0",
+    })
+    casy = defaultdict(list)
+    doby_kol, pameti, volani = [], [], 0
+    with Pool(args.procesy) as pool:
+        for kolo in range(args.kola):
+            cisla = list(range(kolo * args.sessions, (kolo + 1) * args.sessions))
+            zadani = [(cisla[p::args.procesy], args.latence) for p in range(args.procesy)]
+            zacatek = time.perf_counter()
+            for casy_workeru, pamet, volani_workeru in pool.map(worker, zadani):
+                for stranka, c in casy_workeru.items(): casy[stranka] += c
+                pameti.append(pamet)
+                volani += volani_workeru
+            doby_kol.append(time.perf_counter() - zacatek)
+
+    vysledek = {
+        "stranky": {s: {"p50_ms": percentil(c, 50), "p95_ms": percentil(c, 95), "behu": len(c)} for s, c in sorted(casy.items())},
+        "kola_s": doby_kol,
+        "pamet_na_session_kb": float(np.mean(pameti)),
+        "volani_yahoo": volani,
+        "cache": dict(citace_cache(os.environ["METRIKY_ADRESAR"])),
+    }
+
+    print(f"{'stránka':<12}{'běhů':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    for s, v in vysledek["stranky"].items():
+        print(f"{s:<12}{v['behu']:>6}{v['p50_ms']:>10.1f}{v['p95_ms']:>10.1f}")
+    print(f"\nKola (s): {', '.join(f'{d:.2f}' for d in doby_kol)}  (první = studená cache)")
+    print(f"Paměť: ~{vysledek['pamet_na_session_kb']:.0f} KB přírůstku peak RSS na session")
+    print(f"Volání Yahoo: {vysledek['volani_yahoo']} na {args.sessions * args.kola} sessions")
+    for nazev, hodnota in sorted(vysledek["cache"].items()): print(f"  {nazev} {hodnota:.0f}")
+    print("Pozn.: Koupit/Potvrdit jsou v AppTest plné běhy stránky, reruny fragmentů se neměří.")
+    if not os.path.isdir(FIXTURES) or not os.listdir(FIXTURES):
+        print("Pozn.: bez benchmark/fixtures jsou všechny ceny syntetické (viz --nahrat).")
+
+    if args.baseline:
+        zaklad = json.load(open(args.baseline))
+        print("\nProti baseline (p95):")
+        for s, v in vysledek["stranky"].items():
+            if s in zaklad["stranky"]:
+                puvodni = zaklad["stranky"][s]["p95_ms"]
+                print(f"  {s:<12}{puvodni:>10.1f} -> {v['p95_ms']:>8.1f} ms ({100 * (v['p95_ms'] / puvodni - 1):+.0f} %)")
+    if args.ulozit:
+        with open(args.ulozit, "w") as f: json.dump(vysledek, f, indent=2)
+
+if __name__ == "__main__":
+    main()
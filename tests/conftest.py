@@ -0,0 +1,43 @@
+"""app.py je Streamlit skript (import by spustil celé UI), takže testy si z něj berou
+jen importy, definice funkcí a konstanty (bez dekorátorů st.cache_*)."""
+import ast
+import os
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+KOREN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(KOREN, "app.py")
+
+def nacti_definice(cesta=APP):
+    """Modul s definicemi z app.py; jeho atributy jsou globály funkcí (jde je přepsat přes monkeypatch)"""
+    with open(cesta, encoding="utf-8") as f: strom = ast.parse(f.read())
+    modul = types.ModuleType("app")
+    modul.__file__ = cesta
+    prostredi = modul.__dict__
+    importy = [uzel for uzel in strom.body if isinstance(uzel, (ast.Import, ast.ImportFrom))]
+    exec(compile(ast.Module(importy, type_ignores=[]), cesta, "exec"), prostredi)
+    prostredi.update({"np": np, "pd": pd})  # místo líných LinyModul proxy
+    for uzel in strom.body:
+        if isinstance(uzel, ast.Assign) and all(isinstance(t, ast.Name) for t in uzel.targets):
+            try: hodnota = ast.literal_eval(uzel.value)
+            except ValueError: continue  # konstanty počítané za běhu (os.environ ...) testy nepotřebují
+            for t in uzel.targets: prostredi[t.id] = hodnota
+    prostredi["KATALOG_SOUBOR"] = os.path.join(KOREN, "data", "akcie.csv")
+    funkce = [uzel for uzel in strom.body if isinstance(uzel, ast.FunctionDef)]
+    for uzel in funkce: uzel.decorator_list = []
+    exec(compile(ast.Module(funkce, type_ignores=[]), cesta, "exec"), prostredi)
+    return modul
+
+@pytest.fixture(scope="session")
+def app():
+    return nacti_definice()
+
+@pytest.fixture
+def app_sklad(tmp_path):
+    """Čerstvé definice s prázdným SQLite skladem historie v tmp_path"""
+    modul = nacti_definice()
+    modul.HISTORIE_DB = str(tmp_path / "historie.sqlite")
+    return modul
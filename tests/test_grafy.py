@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+@pytest.mark.parametrize("n", [0, 1, 10, 60])
+def test_kratka_serie_zustane(app, n):
+    assert list(app.zmensi_serii(np.arange(n, dtype=float), 60)) == list(range(n))
+
+@pytest.mark.parametrize("n,body", [(61, 60), (252, 60), (1000, 60), (5000, 7)])
+def test_zachova_konce_a_spicky(app, n, body):
+    y = np.random.default_rng(n).standard_normal(n).cumsum()
+    idx = app.zmensi_serii(y, body)
+    assert len(idx) <= body
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert np.all(np.diff(idx) > 0)
+    assert np.argmin(y) in idx and np.argmax(y) in idx
+
+def test_nan_se_nepocita_do_spicek(app):
+    y = np.linspace(0, 1, 500)
+    y[100:110] = np.nan
+    idx = app.zmensi_serii(y, 60)
+    assert not np.isnan(y[idx]).any()
+
+def test_kose_jen_s_nan(app):
+    y = np.linspace(0, 1, 500)
+    y[50:300] = np.nan  # víc než jeden celý koš
+    idx = app.zmensi_serii(y, 60)
+    assert idx[0] == 0 and idx[-1] == 499
+    assert not np.isnan(y[idx]).any()
+    assert 49 in idx and 300 in idx
+
+def test_cela_serie_nan(app):
+    assert list(app.zmensi_serii(np.full(300, np.nan), 60)) == [0, 299]
+
+def test_zmenseny_graf_vraci_radky_grafu(app):
+    graf = pd.DataFrame({"Close": np.random.default_rng(1).standard_normal(252).cumsum()},
+                        index=pd.bdate_range("2025-01-01", periods=252, name="Date"))
+    mensi = app.zmenseny_graf("KO", (252, 0.0), graf)
+    assert len(mensi) <= app.GRAF_BODU_KARTA
+    assert mensi.index[0] == graf.index[0] and mensi.index[-1] == graf.index[-1]
+    pd.testing.assert_frame_equal(mensi, graf.loc[mensi.index])
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# Posledních pár obchodních dní (sklad maže ceny starší než rok)
+DNY = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=5, tz="America/New_York", name="Date")
+DEN = list(DNY.strftime("%Y-%m-%d"))
+
+def yahoo_historie(od, ceny, **sloupce):
+    return pd.DataFrame({"Close": ceny, **sloupce}, index=DNY[od:od + len(ceny)])
+
+def falesne_yahoo(app, odpovedi):
+    """Nahradí stahni_historii_yahoo: period="1y" (od=None) a start=od vrací připravená data"""
+    volani = []
+    def stahni(ticker, od=None):
+        volani.append(od)
+        return odpovedi[od]
+    app.stahni_historii_yahoo = stahni
+    return volani
+
+def ulozene_ceny(app, ticker):
+    hist, _ = app.nacti_historii(ticker)
+    return hist["Close"].to_numpy()
+
+def test_prirustek_bez_prepoctu(app_sklad):
+    app = app_sklad
+    app.uloz_historii("KO", yahoo_historie(0, [60.0, 61.0, 62.0]))
+    volani = falesne_yahoo(app, {DEN[2]: yahoo_historie(2, [62.0, 63.0], Dividends=[0.0, 0.0])})
+    app.obnov_historii("KO", DEN[2])
+    assert volani == [DEN[2]]
+    assert list(ulozene_ceny(app, "KO")) == [60.0, 61.0, 62.0, 63.0]
+
+def test_split_stahne_cely_rok(app_sklad):
+    app = app_sklad
+    app.uloz_historii("NVDA", yahoo_historie(0, [1000.0, 1010.0, 1020.0]))
+    # Split 1:10 v novém dni: Yahoo přepočítá i starší ceny
+    volani = falesne_yahoo(app, {
+        DEN[2]: yahoo_historie(2, [102.0, 103.0], **{"Stock Splits": [0.0, 10.0]}),
+        None: yahoo_historie(0, [100.0, 101.0, 102.0, 103.0]),
+    })
+    app.obnov_historii("NVDA", DEN[2])
+    assert volani == [DEN[2], None]
+    assert list(ulozene_ceny(app, "NVDA")) == [100.0, 101.0, 102.0, 103.0]
+    assert np.abs(np.diff(np.log(ulozene_ceny(app, "NVDA")))).max() < 0.05
+
+def test_posunuty_prekryvny_den_stahne_cely_rok(app_sklad):
+    app = app_sklad
+    app.uloz_historii("PFE", yahoo_historie(0, [30.0, 30.5, 31.0]))
+    # Dividenda mimo stažené okno: sloupec je nulový, ale překryvný den už má upravenou cenu
+    volani = falesne_yahoo(app, {
+        DEN[2]: yahoo_historie(2, [30.6, 30.8], Dividends=[0.0, 0.0]),
+        None: yahoo_historie(0, [29.6, 30.1, 30.6, 30.8]),
+    })
+    app.obnov_historii("PFE", DEN[2])
+    assert volani == [DEN[2], None]
+    assert list(ulozene_ceny(app, "PFE")) == [29.6, 30.1, 30.6, 30.8]
+
+def test_vypadek_pri_plnem_stazeni_necha_stara_data(app_sklad):
+    app = app_sklad
+    app.uloz_historii("XOM", yahoo_historie(0, [110.0, 111.0]))
+    falesne_yahoo(app, {DEN[1]: yahoo_historie(1, [100.0]), None: yahoo_historie(0, [])})
+    app.obnov_historii("XOM", DEN[1])
+    assert list(ulozene_ceny(app, "XOM")) == [110.0, 111.0]
@@ -0,0 +1,51 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+CILE = ["Dividenda", "Růst"]
+RIZIKA = ["Nízké", "Střední", "Vysoké"]
+SEKTORY = ["Konzum", "Tech", "Zdraví", "Energie", "Finance", "Průmysl"]  # nabídka ve wizardu
+KOMBINACE = [
+    (cil, riziko, list(sektory))
+    for cil in CILE for riziko in RIZIKA
+    for pocet in range(3) for sektory in itertools.combinations(SEKTORY, pocet)
+]
+
+def puvodni_filtr(firmy, cil, riziko, sektory):
+    """Původní filtr wizardu přes list comprehensions (před indexy katalogu)"""
+    nalezeno = [x for x in firmy if x['styl'] == cil]
+    temp = [x for x in nalezeno if x['riziko'] == riziko]
+    if len(temp) >= 2: nalezeno = temp
+    bez_shody = False
+    if sektory:
+        temp = [x for x in nalezeno if x['sektor'] in sektory]
+        if temp: nalezeno = temp
+        else: bez_shody = True
+    return nalezeno, bez_shody
+
+def test_pocet_kombinaci():
+    assert len(KOMBINACE) == 132
+
+@pytest.mark.parametrize("cil,riziko,sektory", KOMBINACE)
+def test_filtr_jako_puvodni(app, cil, riziko, sektory):
+    katalog = app.nacti_katalog()
+    vyber, bez_shody = app.filtruj_katalog(katalog, cil, riziko, sektory)
+    assert ([katalog["firmy"][i] for i in vyber], bez_shody) == puvodni_filtr(katalog["firmy"], cil, riziko, sektory)
+
+def test_katalog_ze_souboru(app):
+    firmy = app.nacti_katalog()["firmy"]
+    ko = next(f for f in firmy if f["ticker"] == "KO")
+    assert ko["div_yield"] == 3.1
+    assert ko["div_months"] == ["Duben", "Červenec", "Říjen", "Prosinec"]
+    assert next(f for f in firmy if f["ticker"] == "NVDA")["div_months"] == []
+
+def test_stranka_katalogu(app):
+    katalog = app.nacti_katalog()
+    vyber, _ = app.filtruj_katalog(katalog, "Růst", "Střední", [])
+    assert app.stranka_katalogu(katalog, vyber, 2, 2) == [katalog["firmy"][i] for i in vyber[2:4]]
+
+def test_parquet_jako_csv(app, tmp_path):
+    cesta = str(tmp_path / "akcie.parquet")
+    pd.read_csv(app.KATALOG_SOUBOR).to_parquet(cesta)
+    assert app.nacti_katalog(cesta) == app.nacti_katalog()
@@ -0,0 +1,42 @@
+import threading
+import types
+
+import pytest
+
+class StavSession(dict):
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+@pytest.fixture
+def mereni(app_sklad):
+    app = app_sklad
+    m = {"zamek": threading.Lock(), "citace": {}, "histogramy": {}, "zapsano": 0.0}
+    app.metriky = lambda: m
+    app.exportuj_metriky = lambda: None
+    app.st = types.SimpleNamespace(session_state=StavSession())
+    return app, m
+
+def spust(app, ctx, funkce):
+    app.get_script_run_ctx = lambda: ctx
+    return app.merene_fragment(funkce)()
+
+def test_samostatny_rerun_fragmentu_se_meri(mereni):
+    app, m = mereni
+    def souhrn_portfolia(): return 42
+    assert spust(app, types.SimpleNamespace(fragment_ids_this_run=["abc"]), souhrn_portfolia) == 42
+    h = m["histogramy"][("pruvodce_fragment_seconds", (("fragment", "souhrn_portfolia"),))]
+    assert h["pocet"] == 1
+    assert app.st.session_state.casy_stranek[-1][0] == "souhrn_portfolia (fragment)"
+
+@pytest.mark.parametrize("ctx", [None, types.SimpleNamespace(fragment_ids_this_run=[])])
+def test_fragment_pri_celem_behu_se_nemeri_znovu(mereni, ctx):
+    app, m = mereni
+    assert spust(app, ctx, lambda: 1) == 1
+    assert not m["histogramy"]
+
+def test_rerun_z_fragmentu_se_nemeri(mereni):
+    app, m = mereni
+    class Rerun(Exception): pass
+    def prechod(): raise Rerun
+    with pytest.raises(Rerun): spust(app, types.SimpleNamespace(fragment_ids_this_run=["abc"]), prechod)
+    assert not m["histogramy"]
@@ -0,0 +1,45 @@
+import email.message
+import io
+import os
+import threading
+import urllib.request
+
+import pytest
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+class Odpoved(io.BytesIO):
+    def __init__(self, data, typ):
+        super().__init__(data)
+        self.headers = email.message.Message()
+        self.headers["Content-Type"] = typ
+
+@pytest.fixture
+def obrazky(app_sklad, tmp_path, monkeypatch):
+    app = app_sklad
+    app.STATIC_ADRESAR = str(tmp_path / "assety")
+    app.pocitej = lambda *args, **stitky: None
+    stav = {"zamek": threading.Lock(), "url": {}, "stahuje": {"KO"}, "selhalo": {}}
+    app.obrazky_akcii = lambda: stav
+    def stahni(data, typ):
+        monkeypatch.setattr(urllib.request, "urlopen", lambda url, timeout: Odpoved(data, typ))
+        app.zrcadli_obrazek("KO")
+        return stav
+    return app, stahni
+
+def test_png_se_ulozi(obrazky):
+    app, stahni = obrazky
+    stav = stahni(PNG, "image/png")
+    assert stav["url"]["KO"].startswith(f"{app.STATIC_URL}/akcie-KO.") and not stav["selhalo"] and not stav["stahuje"]
+    assert app.je_png(os.path.join(app.STATIC_ADRESAR, os.path.basename(stav["url"]["KO"])))
+
+@pytest.mark.parametrize("data,typ", [
+    (b"<html>Limit reached</html>", "text/html"),
+    (b"<html>Limit reached</html>", "image/png"),
+    (PNG, "text/html"),
+])
+def test_neobrazek_se_neulozi(obrazky, data, typ):
+    app, stahni = obrazky
+    stav = stahni(data, typ)
+    assert "KO" not in stav["url"] and "KO" in stav["selhalo"] and not stav["stahuje"]
+    assert not os.path.isdir(app.STATIC_ADRESAR) or not os.listdir(app.STATIC_ADRESAR)
@@ -0,0 +1,52 @@
+import csv
+import queue
+import threading
+import time
+
+import pytest
+
+@pytest.fixture
+def zapis(app_sklad, tmp_path):
+    app = app_sklad
+    app.ZAPIS_ADRESAR = str(tmp_path / "zapis")
+    app.ULOZISTE_ZAPISU = "csv"
+    app.ULOZISTE = {"csv": app.zapis_do_csv}
+    return app
+
+def spust_zapisovac(app):
+    """Jako fronta_zapisu, ale bez cache_resource a atexit (test volá dopis_frontu sám)"""
+    stav = {"fronta": queue.Queue(), "zamek": threading.Lock(), "konec": threading.Event()}
+    stav["vlakno"] = threading.Thread(target=app.zapisovac, args=(stav,), daemon=True)
+    stav["vlakno"].start()
+    return stav
+
+def radky_csv(app, list_nazev):
+    with open(f"{app.ZAPIS_ADRESAR}/{list_nazev}.csv", newline="", encoding="utf-8") as f: return list(csv.reader(f))[1:]
+
+def test_konec_dopise_frontu_hned_a_jednou(zapis):
+    stav = spust_zapisovac(zapis)
+    for i in range(3): stav["fronta"].put(("leady", [str(i), f"{i}@example.com", "xtb", "1"]))
+    zacatek = time.perf_counter()
+    zapis.dopis_frontu(stav)
+    assert time.perf_counter() - zacatek < zapis.ZAPIS_INTERVAL  # nečeká na sběr dávky
+    assert not stav["vlakno"].is_alive()
+    assert [r[0] for r in radky_csv(zapis, "leady")] == ["0", "1", "2"]
+
+def test_zaseknuty_zapis_neduplikuje_radky(zapis):
+    uvolni, zapsano = threading.Event(), []
+    def pomale_uloziste(list_nazev, radky):
+        uvolni.wait()
+        zapsano.extend(radky)
+    zapis.ULOZISTE = {"sheets": pomale_uloziste}
+    zapis.ULOZISTE_ZAPISU = "sheets"
+    zapis.ZAPIS_INTERVAL = 0
+    zapis.ZAPIS_KONEC_TIMEOUT = 0.2
+    stav = spust_zapisovac(zapis)
+    stav["fronta"].put(("leady", ["a"]))
+    time.sleep(0.1)  # zapisovač si řádek "a" vzal a visí v zápisu
+    stav["fronta"].put(("leady", ["b"]))
+    zapis.dopis_frontu(stav)
+    uvolni.set()
+    stav["vlakno"].join(1)
+    assert radky_csv(zapis, "leady") == [["b"]]
+    assert zapsano == [["a"]]